@@ -2,15 +2,34 @@
 # Imports
 # ---------------------------------------------------------------------------
 
+import abc
+import argparse
+import bisect
+import csv
+import difflib
+import gzip
+import json
+import math
 import os
+import queue
+import random
 import re
+import socket
+import sqlite3
 import sys
+import tempfile
+import threading
 import time
+import unicodedata
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
-from datetime import datetime, date
-from typing import List, Set, Tuple, Optional
+from datetime import datetime, date, timedelta
+from typing import Any, Callable, Dict, Iterator, List, Set, Tuple, Optional
 
 import gspread
+import requests
 from dotenv import load_dotenv
 from google.oauth2.service_account import Credentials
 from selenium import webdriver
@@ -28,6 +47,11 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
 from webdriver_manager.chrome import ChromeDriverManager
 
+try:
+    import psutil  # optional: browser RSS/handle sampling for CITI_RESTART_BETWEEN_ACCOUNTS=auto
+except ImportError:
+    psutil = None
+
 print("Section 'imports' complete – modules loaded successfully.")
 
 # ---------------------------------------------------------------------------
@@ -42,6 +66,37 @@ def require_file(path: str, description: str) -> str:
 
 print("Function 'require_file' loaded – validates required files exist.")
 
+def parse_cli_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Command-line switches (everything else is configured through .env)."""
+    ap = argparse.ArgumentParser(description="Enroll Citi merchant offers and log them to Google Sheets.")
+    ap.add_argument("--scan-only", action="store_true",
+                    help="inventory offers from the grid tiles on every card without enrolling")
+    ap.add_argument("--worker", action="store_true",
+                    help="pull accounts from the shared work queue (CITI_QUEUE_PATH) instead of running them all")
+    ap.add_argument("--daemon", action="store_true",
+                    help="stay running and re-check each account on a schedule learned from 'Date Added'")
+    ap.add_argument("--query", metavar="MERCHANT",
+                    help="rank active offers for a merchant from the local index (no browser, no login)")
+    ap.add_argument("--spend", type=float, default=100.0,
+                    help="purchase amount used to rank --query results (default 100)")
+    ap.add_argument("--history", metavar="MERCHANT",
+                    help="print archived (expired) offers per month for a merchant")
+    ap.add_argument("--serve-mock-api", metavar="PORT", type=int,
+                    help="serve a local stand-in for the offer-list/enroll endpoints (fast-path testing)")
+    ap.add_argument("--bench-sheets", metavar="SIZES", nargs="?", const="1000,10000,50000",
+                    help="benchmark the Sheets layer on the in-memory fake (comma-separated row counts)")
+    ap.add_argument("--smoke-test", action="store_true",
+                    help="exercise the HTTP fast path against the mock API and the in-memory work queue")
+    ap.add_argument("--record", metavar="DIR",
+                    help="save scrubbed page/grid/modal snapshots of this run as a replay fixture bundle")
+    ap.add_argument("--replay", metavar="DIR",
+                    help="re-run a recorded fixture bundle offline (local server, fake Sheets) and compare timings")
+    # parse_known_args: IDE/debugger launchers sometimes append their own flags
+    return ap.parse_known_args(argv)[0]
+
+CLI = parse_cli_args()
+print("CLI parsed – " + ", ".join(f"{k}={v}" for k, v in vars(CLI).items()) + ".")
+
 # Project location
 DEFAULT_PROJECT_ROOT = r"C:\Users\Andrew\PycharmProjects\Citi-Offers"
 PROJECT_ROOT = Path(os.getenv("PROJECT_ROOT", DEFAULT_PROJECT_ROOT)).resolve()
@@ -64,7 +119,8 @@ while os.getenv(f"CITI_USERNAME_{idx}"):
         "holder": os.getenv(f"CITI_HOLDER_{idx}", f"Holder {idx}"),
     })
     idx += 1
-if not ACCOUNTS:
+if not ACCOUNTS and not (CLI.query or CLI.history or CLI.serve_mock_api or CLI.bench_sheets or CLI.smoke_test
+                        or CLI.replay):
     sys.exit("No Citi accounts found in .env – aborting")
 print(f"Accounts loaded – {len(ACCOUNTS)} account(s) configured.")
 
@@ -78,11 +134,124 @@ SECOND_MONITOR_OFFSET = (3440, 0)  # Move to your 2nd screen if you have one
 PAGE_LOAD_PAUSE = float(os.getenv("CITI_PAGE_LOAD_PAUSE", "4.0"))
 OFFERS_RETRY_MAX = int(os.getenv("CITI_OFFERS_RETRY_MAX", "8"))
 NAV_MENU_FALLBACK = os.getenv("CITI_NAV_MENU_FALLBACK", "true").lower() == "true"
-RESTART_BETWEEN_ACCOUNTS = os.getenv("CITI_RESTART_BETWEEN_ACCOUNTS", "true").lower() == "true"
+RESTART_MODE = os.getenv("CITI_RESTART_BETWEEN_ACCOUNTS", "auto").lower()  # true | false | auto (resource-based)
 NEW_WINDOW_SETTLE_PAUSE = 1.2   # one extra second after new browser opens
 SWITCH_CARD_SETTLE_PAUSE = 1.0  # small pause after switching card selection
+EXPAND_TIMEOUT = float(os.getenv("CITI_EXPAND_TIMEOUT", "20"))  # cap for the in-page grid expansion
+CARD_TABS = max(1, int(os.getenv("CITI_CARD_TABS", "1")))  # >1 preloads upcoming cards in extra tabs
+NAV_STATS_PATH = PROJECT_ROOT / os.getenv("CITI_NAV_STATS_FILE", "nav_stats.json")
+NAV_STATS_KEEP = 50         # most recent samples kept per account/strategy
+NAV_STATS_MIN_SAMPLES = 5   # history needed before a strategy is reordered/skipped
+NAV_SKIP_BELOW = 0.05       # skip strategies that almost never win (except on the last try)
 print("Constants ready – navigation timing and retry settings applied.")
 
+# Sheets API quota & batching
+SHEETS_RPM = int(os.getenv("CITI_SHEETS_RPM", "60"))                 # per-user write quota per minute
+SHEETS_MAX_RETRIES = int(os.getenv("CITI_SHEETS_MAX_RETRIES", "6"))
+SHEETS_BACKOFF_BASE = 1.0     # seconds; doubled per retry (full jitter)
+SHEETS_BACKOFF_CAP = 64.0
+SHEETS_FLUSH_ROWS = int(os.getenv("CITI_SHEETS_FLUSH_ROWS", "25"))   # pending rows before auto-flush
+SHEETS_FLUSH_SECS = float(os.getenv("CITI_SHEETS_FLUSH_SECS", "15")) # oldest pending write before auto-flush
+SHEETS_BACKEND = "fake" if CLI.bench_sheets or CLI.smoke_test else os.getenv("CITI_SHEETS_BACKEND", "gspread").lower()
+FAKE_SHEETS_LATENCY_MS = float(os.getenv("CITI_FAKE_SHEETS_LATENCY_MS", "0"))  # added to every fake API call
+FAKE_SHEETS_429_RATE = float(os.getenv("CITI_FAKE_SHEETS_429_RATE", "0"))     # share of fake calls failing with 429
+
+# Log sheet rotation: past LOG_MAX_ROWS, everything but the newest LOG_KEEP_ROWS is archived
+LOG_MAX_ROWS = int(os.getenv("CITI_LOG_MAX_ROWS", "5000"))
+LOG_KEEP_ROWS = int(os.getenv("CITI_LOG_KEEP_ROWS", "1000"))
+LOG_ARCHIVE = os.getenv("CITI_LOG_ARCHIVE", "sheet").lower()  # sheet -> "Log YYYY-MM" tabs; jsonl -> logs/*.jsonl.gz
+LOG_ARCHIVE_DIR = PROJECT_ROOT / "logs"
+LOG_ROW_PX = 21
+print("Constants ready – Sheets quota and batching settings applied.")
+
+# Output destination: "sheets" writes straight to Google Sheets; csv/jsonl/sqlite
+# write locally on the hot path and (optionally) replicate to Sheets in the background
+OUTPUT_SINK = "sheets" if CLI.bench_sheets or CLI.smoke_test else os.getenv("CITI_OUTPUT_SINK", "sheets").lower()
+OUTPUT_DIR = Path(os.getenv("CITI_OUTPUT_DIR", str(PROJECT_ROOT)))
+SHEETS_REPLICA = os.getenv("CITI_SHEETS_REPLICA", "true").lower() == "true"
+# Parsed offer terms are cached per run; set a file name to keep them across runs
+TERMS_CACHE_FILE = os.getenv("CITI_TERMS_CACHE_FILE", "")
+
+# Parse/persist pipeline behind the browser thread
+PIPELINE_WORKERS = max(1, int(os.getenv("CITI_PARSE_WORKERS", "2")))
+PIPELINE_QUEUE = int(os.getenv("CITI_PIPELINE_QUEUE", "64"))       # raw payloads in flight (backpressure)
+PIPELINE_FLUSH_ROWS = int(os.getenv("CITI_FLUSH_EVERY", "25"))     # rows per mid-card write
+
+# Shared account work queue (--worker): SQLite on a shared volume, or in-memory stand-in
+QUEUE_BACKEND = os.getenv("CITI_QUEUE_BACKEND", "sqlite").lower()
+QUEUE_PATH = Path(os.getenv("CITI_QUEUE_PATH", str(PROJECT_ROOT / "work_queue.sqlite3")))
+QUEUE_RUN_ID = os.getenv("CITI_QUEUE_RUN", date.today().isoformat())  # one batch of jobs per run id
+QUEUE_LEASE_SECS = int(os.getenv("CITI_QUEUE_LEASE_SECS", "900"))     # reclaimed if not renewed in time
+QUEUE_HEARTBEAT_SECS = max(5, QUEUE_LEASE_SECS // 5)
+QUEUE_MAX_ATTEMPTS = int(os.getenv("CITI_QUEUE_MAX_ATTEMPTS", "3"))
+QUEUE_RETRY_BASE = float(os.getenv("CITI_QUEUE_RETRY_BASE", "120"))   # seconds; doubled per attempt
+QUEUE_POLL_SECS = 15.0
+# Hosts taking part in one run; each enqueues only its own accounts, so cleanup
+# waits until this many distinct hosts have joined (and enqueued)
+QUEUE_HOSTS = max(1, int(os.getenv("CITI_QUEUE_HOSTS", "1")))
+WORKER_HOST = os.getenv("CITI_WORKER_HOST", socket.gethostname())
+WORKER_ID = f"{WORKER_HOST}-{os.getpid()}"
+
+# Daemon mode (--daemon): per-account re-check interval learned from offer history
+DAEMON_STATE_PATH = PROJECT_ROOT / os.getenv("CITI_DAEMON_STATE_FILE", "daemon_state.json")
+DAEMON_MIN_HOURS = float(os.getenv("CITI_DAEMON_MIN_HOURS", "12"))
+DAEMON_MAX_HOURS = float(os.getenv("CITI_DAEMON_MAX_HOURS", "168"))
+DAEMON_LOOKBACK_DAYS = int(os.getenv("CITI_DAEMON_LOOKBACK_DAYS", "60"))
+DAEMON_MAX_SLEEP = 3600.0  # wake at least hourly to pick up config/sheet changes
+# Merchant lookup index (--query); kept current as scrape_card writes rows
+INDEX_PATH = PROJECT_ROOT / os.getenv("CITI_INDEX_FILE", "offer_index.json")
+
+# Expired offers are moved here (month-partitioned, column-per-file, gzip) before deletion
+ARCHIVE_DIR = PROJECT_ROOT / os.getenv("CITI_ARCHIVE_DIR", "offer_archive")
+
+# Browser-less fast path: reuse the logged-in session's cookies for direct API calls
+HTTP_FAST_PATH = os.getenv("CITI_HTTP_FAST_PATH", "false").lower() == "true"
+API_BASE = os.getenv("CITI_API_BASE", "https://online.citi.com").rstrip("/")
+API_OFFERS_PATH = os.getenv("CITI_API_OFFERS_PATH", "/US/REST/merchantoffers/offers")
+API_ENROLL_PATH = os.getenv("CITI_API_ENROLL_PATH", "/US/REST/merchantoffers/offers/{offer_id}/enroll")
+HTTP_CONCURRENCY = int(os.getenv("CITI_HTTP_CONCURRENCY", "4"))
+HTTP_RPM = int(os.getenv("CITI_HTTP_RPM", "60"))     # conservative; well under what the UI itself sends
+HTTP_TIMEOUT = float(os.getenv("CITI_HTTP_TIMEOUT", "15"))
+
+# Watchdog: hard upper bounds so one hung WebDriver call can't stall the run
+PAGE_LOAD_TIMEOUT = float(os.getenv("CITI_PAGE_LOAD_TIMEOUT", "60"))
+COMMAND_DEADLINE = float(os.getenv("CITI_COMMAND_DEADLINE", "120"))   # any single WebDriver command
+CARD_DEADLINE = float(os.getenv("CITI_CARD_DEADLINE", "900"))
+ACCOUNT_DEADLINE = float(os.getenv("CITI_ACCOUNT_DEADLINE", "3600"))
+RUN_REPORT_PATH = PROJECT_ROOT / os.getenv("CITI_RUN_REPORT_FILE", "run_report.json")
+
+# Browser recycling thresholds (RESTART_MODE=auto)
+RECYCLE_RSS_MB = float(os.getenv("CITI_RECYCLE_RSS_MB", "2500"))        # chromedriver + Chrome process tree
+RECYCLE_HANDLES = int(os.getenv("CITI_RECYCLE_HANDLES", "20000"))       # Windows handles / POSIX fds, whole tree
+RECYCLE_LATENCY_X = float(os.getenv("CITI_RECYCLE_LATENCY_X", "3.0"))   # probe latency vs. fresh-browser baseline
+RECYCLE_MAX_ACCOUNTS = int(os.getenv("CITI_RECYCLE_MAX_ACCOUNTS", "10")) # restart at least this often regardless
+if psutil is None and RESTART_MODE == "auto" and not (CLI.query or CLI.history or CLI.serve_mock_api
+                                                      or CLI.bench_sheets or CLI.smoke_test):
+    print("[WARN] psutil not installed – auto recycling ignores RSS/handle limits and a watchdog kill "
+          "can't reap Chrome children (pip install psutil).")
+
+# Record & replay: deterministic offline re-runs of a recorded session
+RECORD_DIR = Path(CLI.record).resolve() if CLI.record else None
+REPLAY_DIR = Path(CLI.replay).resolve() if CLI.replay else None
+SCRUB_TERMS = [t.strip() for t in os.getenv("CITI_SCRUB_TERMS", "").split(",") if t.strip()]  # extra text to redact
+if RECORD_DIR:
+    HTTP_FAST_PATH = False  # the recording has to see the browser flow
+if REPLAY_DIR:
+    # Nothing a replay does may touch real state: fake Sheets, throwaway local files
+    REPLAY_TMP = Path(tempfile.mkdtemp(prefix="citi-replay-"))
+    SHEETS_BACKEND, OUTPUT_SINK, HTTP_FAST_PATH, TERMS_CACHE_FILE = "fake", "sheets", False, ""
+    NAV_STATS_PATH = REPLAY_TMP / "nav_stats.json"
+    INDEX_PATH = REPLAY_TMP / "offer_index.json"
+    ARCHIVE_DIR = REPLAY_TMP / "offer_archive"
+    RUN_REPORT_PATH = REPLAY_DIR / "replays" / f"run-{datetime.now():%Y%m%d-%H%M%S}.json"
+
+# What this invocation needs: --query/--history answer from local files alone
+LOCAL_ONLY = bool(CLI.query or CLI.history or CLI.serve_mock_api or CLI.bench_sheets or CLI.smoke_test)
+NEEDS_BROWSER = not LOCAL_ONLY
+NEEDS_SHEETS = not LOCAL_ONLY or bool(CLI.bench_sheets or CLI.smoke_test) or (
+    bool(CLI.query) and OUTPUT_SINK == "sheets" and not INDEX_PATH.exists())
+print(f"Output sink: {OUTPUT_SINK}" + (" (+ Sheets replica)" if OUTPUT_SINK != "sheets" and SHEETS_REPLICA else ""))
+
 print("Section 'configuration & constants' complete – runtime config set.")
 
 # ---------------------------------------------------------------------------
@@ -125,13 +294,424 @@ def resolve_service_account_path() -> str:
 
 print("Function 'resolve_service_account_path' loaded – SA path resolver ready.")
 
-SA_PATH = resolve_service_account_path()
-require_file(SA_PATH, "Google service-account JSON")
 SCOPES = ["https://www.googleapis.com/auth/spreadsheets",
           "https://www.googleapis.com/auth/drive"]
-CREDS  = Credentials.from_service_account_file(SA_PATH, scopes=SCOPES)
-SHEET  = gspread.authorize(CREDS).open("Credit Card Offers")
-print("Google Sheets client initialized – workbook opened.")
+
+# --- In-memory stand-in for the gspread calls this script makes ---
+def _fake_api_error(code: int, message: str) -> gspread.exceptions.APIError:
+    resp = requests.Response()
+    resp.status_code = code
+    resp._content = json.dumps({"error": {"code": code, "message": message}}).encode()
+    return gspread.exceptions.APIError(resp)
+
+def _col_letter(n: int) -> str:
+    """1 -> A, 27 -> AA."""
+    out = ""
+    while n:
+        n, rem = divmod(n - 1, 26)
+        out = chr(65 + rem) + out
+    return out
+
+class FakeWorksheet:
+    """One tab of a FakeSpreadsheet; `data` holds the values, `row_count` the grid size."""
+
+    def __init__(self, book: "FakeSpreadsheet", sheet_id: int, title: str, rows: int, cols: int):
+        self.book = book
+        self.id = sheet_id
+        self.title = title
+        self.row_count = rows
+        self.col_count = cols
+        self.data: List[List[str]] = []
+
+    def write(self, a1: str, values: List[list]) -> None:
+        """Write `values` with the top-left cell at the start of `a1` ('1:1', 'A5', 'B2:C3')."""
+        m = re.match(r"([A-Z]*)(\d+)", a1)
+        col = 0
+        for ch in m.group(1):
+            col = col * 26 + ord(ch) - 64
+        row0, col0 = int(m.group(2)) - 1, max(col, 1) - 1
+        for ri, vals in enumerate(values):
+            while len(self.data) <= row0 + ri:
+                self.data.append([])
+            row = self.data[row0 + ri]
+            row.extend([""] * (col0 + len(vals) - len(row)))
+            row[col0:col0 + len(vals)] = ["" if v is None else str(v) for v in vals]
+        self.row_count = max(self.row_count, len(self.data))
+
+    def row_values(self, row: int) -> List[str]:
+        self.book.api("row_values")
+        vals = list(self.data[row - 1]) if row <= len(self.data) else []
+        while vals and vals[-1] == "":
+            vals.pop()
+        return vals
+
+    def get_all_values(self) -> List[List[str]]:
+        self.book.api("get_all_values")
+        width = max((len(r) for r in self.data), default=0)
+        return [list(r) + [""] * (width - len(r)) for r in self.data]
+
+    def append_row(self, values: list, **kwargs) -> dict:
+        return self.append_rows([values], **kwargs)
+
+    def append_rows(self, values: List[list], value_input_option: str = "RAW",
+                    insert_data_option: Optional[str] = None, **kwargs) -> dict:
+        self.book.api("append_rows")
+        start = len(self.data) + 1
+        self.data.extend(["" if v is None else str(v) for v in r] for r in values)
+        if insert_data_option == "INSERT_ROWS":
+            self.row_count += len(values)
+        self.row_count = max(self.row_count, len(self.data))
+        width = max((len(r) for r in values), default=1)
+        return {"updates": {"updatedRange": f"'{self.title}'!A{start}:{_col_letter(width)}{len(self.data)}",
+                            "updatedRows": len(values)}}
+
+    def update(self, *args, **kwargs) -> dict:
+        """Accepts both gspread orders: update(range, values) and update(values, range_name)."""
+        self.book.api("update")
+        if isinstance(args[0], str):
+            a1, values = args[0], args[1]
+        else:
+            values, a1 = args[0], (args[1] if len(args) > 1 else kwargs.get("range_name", "A1"))
+        self.write(a1, [list(v) for v in values])
+        return {"updatedRange": f"'{self.title}'!{a1}"}
+
+class FakeSpreadsheet:
+    """
+    In-memory spreadsheet implementing the gspread surface used here. Every call
+    is counted in `calls`, delayed by FAKE_SHEETS_LATENCY_MS and fails with a
+    429 APIError at FAKE_SHEETS_429_RATE (seeded, so runs are repeatable).
+    """
+
+    def __init__(self, title: str, seed: int = 0):
+        self.title = title
+        self.calls: Dict[str, int] = {}
+        self._tabs: List[FakeWorksheet] = []
+        self._rng = random.Random(seed)
+
+    def api(self, name: str) -> None:
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if FAKE_SHEETS_LATENCY_MS:
+            time.sleep(FAKE_SHEETS_LATENCY_MS / 1000.0)
+        if FAKE_SHEETS_429_RATE and self._rng.random() < FAKE_SHEETS_429_RATE:
+            raise _fake_api_error(429, "Quota exceeded (fake backend)")
+
+    def _tab(self, sheet_id: int) -> FakeWorksheet:
+        for ws in self._tabs:
+            if ws.id == sheet_id:
+                return ws
+        raise _fake_api_error(400, f"No grid with id: {sheet_id}")
+
+    def worksheets(self) -> List[FakeWorksheet]:
+        self.api("worksheets")
+        return list(self._tabs)
+
+    def worksheet(self, title: str) -> FakeWorksheet:
+        self.api("worksheet")
+        for ws in self._tabs:
+            if ws.title == title:
+                return ws
+        raise gspread.exceptions.WorksheetNotFound(title)
+
+    def add_worksheet(self, title: str, rows: int = 1000, cols: int = 26, **kwargs) -> FakeWorksheet:
+        self.api("add_worksheet")
+        ws = FakeWorksheet(self, len(self._tabs) + 1, title, int(rows), int(cols))
+        self._tabs.append(ws)
+        return ws
+
+    def values_batch_update(self, body: dict) -> dict:
+        self.api("values_batch_update")
+        for item in body.get("data", []):
+            title, a1 = item["range"].rsplit("!", 1)
+            title = title.strip("'").replace("''", "'")
+            ws = next((w for w in self._tabs if w.title == title), None)
+            if ws is None:
+                raise _fake_api_error(400, f"Unable to parse range: {item['range']}")
+            ws.write(a1, item["values"])
+        return {"totalUpdatedCells": sum(len(r) for d in body.get("data", []) for r in d["values"])}
+
+    def batch_update(self, body: dict) -> dict:
+        self.api("batch_update")
+        for req in body.get("requests", []):
+            (kind, spec), = req.items()
+            if kind in ("deleteRange", "deleteDimension"):
+                rng = spec["range"]
+                ws = self._tab(rng["sheetId"])
+                start = rng.get("startRowIndex", rng.get("startIndex", 0))
+                end = rng.get("endRowIndex", rng.get("endIndex", ws.row_count))
+                del ws.data[start:end]
+                ws.row_count -= min(end, ws.row_count) - start
+            elif kind in ("updateDimensionProperties", "clearBasicFilter", "setBasicFilter"):
+                self._tab((spec.get("range") or spec.get("filter", {}).get("range") or spec)["sheetId"])
+            else:
+                raise _fake_api_error(400, f"Unsupported request in fake backend: {kind}")
+        return {"replies": [{} for _ in body.get("requests", [])]}
+
+print("Classes 'FakeSpreadsheet', 'FakeWorksheet' loaded – in-memory Sheets backend ready.")
+
+def open_workbook():
+    """Open the 'Credit Card Offers' workbook on the configured backend."""
+    if SHEETS_BACKEND == "fake":
+        print("Fake Sheets backend – nothing leaves this process.")
+        return FakeSpreadsheet("Credit Card Offers")
+    sa_path = resolve_service_account_path()
+    require_file(sa_path, "Google service-account JSON")
+    creds = Credentials.from_service_account_file(sa_path, scopes=SCOPES)
+    workbook = gspread.authorize(creds).open("Credit Card Offers")
+    print("Google Sheets client initialized – workbook opened.")
+    return workbook
+
+# With a local sink, Sheets is only the replica: it is opened off the hot path
+# (open_sheets) so an unreachable or throttled API can't stop the run.
+SHEETS_DEFERRED = NEEDS_SHEETS and OUTPUT_SINK != "sheets"
+if NEEDS_SHEETS and not SHEETS_DEFERRED:
+    SHEET = open_workbook()
+elif SHEETS_DEFERRED:
+    SHEET = None
+    print("Google Sheets deferred – local sink is primary; the workbook opens in the background.")
+else:
+    SHEET = None
+    print("Google Sheets skipped – not needed for this mode.")
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate_per_min` tokens per minute, small burst."""
+
+    def __init__(self, rate_per_min: float, capacity: Optional[float] = None):
+        self.rate = max(rate_per_min, 1) / 60.0
+        # A burst of a full minute's quota could double up across a rolling window
+        self.capacity = capacity or max(1.0, rate_per_min / 6.0)
+        self._tokens = self.capacity
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+                self._stamp = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                pause = (tokens - self._tokens) / self.rate
+            time.sleep(pause)
+
+print("Class 'TokenBucket' loaded – rate limiter ready.")
+
+def _api_status(exc: Exception) -> Optional[int]:
+    """HTTP status of a gspread APIError (attribute differs across versions)."""
+    code = getattr(exc, "code", None)
+    if isinstance(code, int):
+        return code
+    return getattr(getattr(exc, "response", None), "status_code", None)
+
+class SheetsClient:
+    """
+    Single gateway to the Sheets API. Every call takes a token sized to the
+    per-minute quota and is retried with jittered exponential backoff on 429/5xx.
+    Row appends, value writes and formatting requests are queued and coalesced
+    by flush(); reads flush first so callers always see their own writes.
+    Queueing never touches the network: a background thread flushes once
+    SHEETS_FLUSH_ROWS are pending or the oldest is SHEETS_FLUSH_SECS old, so
+    sheet_log() never blocks the browser thread on the API. A queued write
+    that fails is logged and dropped by flush(); reads, batch_update and
+    flush=True writes raise only for their own request.
+    """
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self, spreadsheet, rpm: int = SHEETS_RPM):
+        self.spreadsheet = spreadsheet
+        self.bucket = TokenBucket(rpm)
+        self.calls = 0
+        self._lock = threading.RLock()      # guards the queues only; never held across API calls
+        self._io_lock = threading.RLock()   # serializes flushes/reads against each other
+        self._appends: Dict[int, Tuple[Any, List[list]]] = {}  # ws.id -> (ws, rows)
+        self._values: List[dict] = []
+        self._requests: List[dict] = []
+        self._row_heights: Dict[int, int] = {}  # ws.id -> pixel height for appended rows
+        self._oldest: Optional[float] = None
+        self._paused: Set[int] = set()           # ws ids whose appends flush() holds back
+        threading.Thread(target=self._flusher, name="sheets-flush", daemon=True).start()
+
+    def call(self, fn: Callable, *args, **kwargs):
+        """Run one API call under the rate limit, backing off on quota/server errors."""
+        for attempt in range(SHEETS_MAX_RETRIES + 1):
+            self.bucket.acquire()
+            self.calls += 1
+            try:
+                return fn(*args, **kwargs)
+            except gspread.exceptions.APIError as exc:
+                status = _api_status(exc)
+                if status not in self.RETRY_STATUSES or attempt >= SHEETS_MAX_RETRIES:
+                    raise
+                delay = random.uniform(0, min(SHEETS_BACKOFF_CAP, SHEETS_BACKOFF_BASE * 2 ** attempt))
+                # print, not sheet_log – logging goes through this client too
+                print(f"[SHEETS] HTTP {status} – backing off {delay:.1f}s (retry {attempt + 1})")
+                time.sleep(delay)
+
+    # -- queued writes ------------------------------------------------------
+
+    def _pending_rows(self) -> int:
+        return sum(len(rows) for _, rows in self._appends.values()) + len(self._values) + len(self._requests)
+
+    def _queued(self) -> None:
+        """Caller holds _lock."""
+        if self._oldest is None:
+            self._oldest = time.time()
+
+    def _flush_due(self) -> bool:
+        with self._lock:
+            return self._oldest is not None and (self._pending_rows() >= SHEETS_FLUSH_ROWS
+                                                 or time.time() - self._oldest >= SHEETS_FLUSH_SECS)
+
+    def _flusher(self) -> None:
+        while True:
+            time.sleep(1.0)
+            if self._flush_due():
+                try:
+                    self.flush()
+                except Exception as exc:
+                    print(f"[SHEETS] background flush failed ({type(exc).__name__}: {exc})")
+
+    def append_rows(self, ws, rows: List[list], flush: bool = False) -> None:
+        """
+        Queue rows for `ws`; all pending rows per worksheet go out in one append.
+        flush=True sends them now (after anything pending) and raises if they fail.
+        """
+        if not rows:
+            return
+        if flush:
+            self.flush()
+            self.append_now(ws, rows)
+            return
+        with self._lock:
+            self._appends.setdefault(ws.id, (ws, []))[1].extend(list(r) for r in rows)
+            self._queued()
+        if flush:
+            self.flush()
+
+    def append_now(self, ws, rows: List[list]) -> None:
+        """Append `rows` in one call of their own, raising only if that append failed."""
+        with self._io_lock:
+            resp = self.call(ws.append_rows, [list(r) for r in rows],
+                             value_input_option="RAW", insert_data_option="INSERT_ROWS")
+        self._queue_row_height(ws, resp)
+
+    def update_values(self, ws, a1_range: str, values: List[list], flush: bool = False) -> None:
+        """
+        Queue a value write; pending writes share one values_batch_update.
+        flush=True sends it now (after anything pending) and raises if it fails.
+        """
+        data = {"range": f"'{ws.title}'!{a1_range}", "values": values}
+        if flush:
+            self.flush()
+            with self._io_lock:
+                self.call(self.spreadsheet.values_batch_update, {"valueInputOption": "RAW", "data": [data]})
+            return
+        with self._lock:
+            self._values.append(data)
+            self._queued()
+
+    def queue_requests(self, requests: List[dict]) -> None:
+        """Queue formatting/structural requests; pending ones share one batch_update."""
+        if not requests:
+            return
+        with self._lock:
+            self._requests.extend(requests)
+            self._queued()
+
+    def batch_update(self, requests: List[dict]) -> None:
+        """Send requests now, after anything pending; raises only if these requests fail."""
+        if not requests:
+            return
+        with self._io_lock:
+            self.flush()
+            self.call(self.spreadsheet.batch_update, {"requests": requests})
+
+    @contextmanager
+    def appends_paused(self, ws) -> Iterator[None]:
+        """Keep `ws`'s queued appends out of every flush in the block; they go out afterwards, in order."""
+        with self._lock:
+            self._paused.add(ws.id)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._paused.discard(ws.id)
+
+    def hold(self) -> threading.RLock:
+        """Lock to keep other threads' flushes out of a read-then-modify sequence."""
+        return self._io_lock
+
+    def fix_row_height(self, ws, px: int) -> None:
+        """Give rows appended to `ws` a fixed height (formats only the new range)."""
+        self._row_heights[ws.id] = px
+
+    def _queue_row_height(self, ws, resp) -> None:
+        """Queue the fixed row height (if any) for the range an append just wrote."""
+        span = self._appended_span(resp) if ws.id in self._row_heights else None
+        if span:
+            self.queue_requests([{"updateDimensionProperties": {
+                "range": {"sheetId": ws.id, "dimension": "ROWS", "startIndex": span[0], "endIndex": span[1]},
+                "properties": {"pixelSize": self._row_heights[ws.id]}, "fields": "pixelSize"}}])
+
+    @staticmethod
+    def _appended_span(resp) -> Optional[Tuple[int, int]]:
+        """0-based [start, end) rows from an append response's updatedRange."""
+        rng = ((resp or {}).get("updates") or {}).get("updatedRange", "") if isinstance(resp, dict) else ""
+        m = re.search(r"![A-Z]+(\d+)(?::[A-Z]+(\d+))?$", rng)
+        if not m:
+            return None
+        return int(m.group(1)) - 1, int(m.group(2) or m.group(1))
+
+    def flush(self) -> None:
+        """
+        Send everything pending: appends, then values, then requests. Failures
+        are logged and the writes dropped – a lost log row must not fail
+        whichever read or write happened to trigger the flush.
+        """
+        with self._io_lock:
+            with self._lock:
+                appends = {k: v for k, v in self._appends.items() if k not in self._paused}
+                self._appends = {k: v for k, v in self._appends.items() if k in self._paused}
+                values, self._values = self._values, []
+                requests, self._requests = self._requests, []
+                self._oldest = time.time() if self._appends else None
+            for ws, rows in appends.values():
+                try:
+                    resp = self.call(ws.append_rows, rows, value_input_option="RAW", insert_data_option="INSERT_ROWS")
+                    span = self._appended_span(resp) if ws.id in self._row_heights else None
+                    if span:
+                        requests.append({"updateDimensionProperties": {
+                            "range": {"sheetId": ws.id, "dimension": "ROWS",
+                                      "startIndex": span[0], "endIndex": span[1]},
+                            "properties": {"pixelSize": self._row_heights[ws.id]}, "fields": "pixelSize"}})
+                except Exception as exc:
+                    print(f"[SHEETS] dropped {len(rows)} row(s) for '{ws.title}' ({type(exc).__name__}: {exc})")
+            if values:
+                try:
+                    self.call(self.spreadsheet.values_batch_update,
+                              {"valueInputOption": "RAW", "data": values})
+                except Exception as exc:
+                    print(f"[SHEETS] dropped {len(values)} value write(s) ({type(exc).__name__}: {exc})")
+            if requests:
+                try:
+                    self.call(self.spreadsheet.batch_update, {"requests": requests})
+                except Exception as exc:
+                    print(f"[SHEETS] dropped {len(requests)} request(s) ({type(exc).__name__}: {exc})")
+
+    # -- reads --------------------------------------------------------------
+
+    def get_all_values(self, ws) -> List[List[str]]:
+        self.flush()
+        return self.call(ws.get_all_values)
+
+    def row_values(self, ws, row: int) -> List[str]:
+        self.flush()
+        return self.call(ws.row_values, row)
+
+print("Class 'SheetsClient' loaded – quota-aware Sheets gateway ready.")
+
+SHEETS = SheetsClient(SHEET) if SHEET else None
 
 OFFER_HEADERS = (
     "Card Holder", "Last Four", "Card Name", "Brand",
@@ -139,32 +719,31 @@ OFFER_HEADERS = (
     "Date Added", "Expiration", "Local"
 )
 
-def _ws(sheet, title: str, headers: Tuple[str, ...]):
-    """Create or fetch a worksheet and ensure the header row matches."""
-    existing = {w.title: w for w in sheet.worksheets()}
-    ws = existing.get(title) or sheet.add_worksheet(title=title, rows=2000, cols=len(headers))
-    first_row = ws.row_values(1)
+def _ws(sheet, title: str, headers: Tuple[str, ...], rows: int = 2000):
+    """Create (with a `rows`-row grid) or fetch a worksheet and ensure the header row matches."""
+    existing = {w.title: w for w in SHEETS.call(sheet.worksheets)}
+    ws = existing.get(title) or SHEETS.call(sheet.add_worksheet, title=title, rows=rows, cols=len(headers))
+    first_row = SHEETS.row_values(ws, 1)
     if first_row != list(headers):
         if not first_row:
-            ws.append_row(list(headers), value_input_option="RAW")
+            SHEETS.call(ws.append_row, list(headers), value_input_option="RAW")
         else:
-            ws.update("1:1", [headers], value_input_option="RAW")
+            SHEETS.update_values(ws, "A1", [list(headers)], flush=True)
     return ws
 
 print("Function '_ws' loaded – worksheet bootstrap ready.")
 
-OFFER_WS = _ws(SHEET, "Card Offers", OFFER_HEADERS)
-LOG_WS   = _ws(SHEET, "Log", ("Time", "Level", "Function", "Message"))
-print("Worksheets ready – 'Card Offers' and 'Log' ensured.")
+LOG_HEADERS = ("Time", "Level", "Function", "Message")
+OFFER_WS = None  # set by open_sheets()
+LOG_WS   = None
 
 def sheet_log(level: str, func: str, msg: str):
-    """Append a log entry to the Log sheet (simple breadcrumb trail)."""
+    """Queue a log entry for the Log sheet (flushed in batches by SHEETS)."""
+    if LOG_WS is None:
+        print(f"[{level}] {func}: {msg}")
+        return
     try:
-        LOG_WS.append_row(
-            [datetime.now().strftime("%Y-%m-%d %H:%M:%S"), level, func, msg],
-            value_input_option="RAW",
-            insert_data_option="INSERT_ROWS"
-        )
+        SHEETS.append_rows(LOG_WS, [[datetime.now().strftime("%Y-%m-%d %H:%M:%S"), level, func, msg]])
     except Exception as exc:
         # Don’t crash if logging fails; just print so you see it.
         print(f"[LOG_FAIL] {level} {func}: {msg} ({type(exc).__name__}: {exc})")
@@ -172,51 +751,652 @@ def sheet_log(level: str, func: str, msg: str):
 print("Function 'sheet_log' loaded – spreadsheet logging enabled.")
 
 def set_log_row_height():
-    """Make log rows easier to read (fixed height)."""
-    sid = LOG_WS.id  # public property, not _properties
-    SHEET.batch_update({
-        "requests": [{
-            "updateDimensionProperties": {
-                "range": {"sheetId": sid, "dimension": "ROWS"},
-                "properties": {"pixelSize": 21}, "fields": "pixelSize"
-            }
-        }]
-    })
+    """Make log rows easier to read (fixed height) – applied to each newly appended range."""
+    SHEETS.fix_row_height(LOG_WS, LOG_ROW_PX)
 
 print("Function 'set_log_row_height' loaded – log sheet formatting ready.")
-set_log_row_height()
+
+def archive_log_rows(rows: List[List[str]]) -> None:
+    """Move log rows to per-month archives ('Log YYYY-MM' tabs or logs/log-YYYY-MM.jsonl.gz)."""
+    by_month: Dict[str, List[List[str]]] = {}
+    for r in rows:
+        by_month.setdefault((r[0] if r else "")[:7] or "undated", []).append(r)
+    for month, chunk in sorted(by_month.items()):
+        if LOG_ARCHIVE == "jsonl":
+            LOG_ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+            # gzip members can be appended; readers see one continuous stream
+            with gzip.open(LOG_ARCHIVE_DIR / f"log-{month}.jsonl.gz", "at", encoding="utf-8") as fh:
+                for r in chunk:
+                    fh.write(json.dumps(dict(zip(LOG_HEADERS, r)), ensure_ascii=False) + "\n")
+        else:
+            # Header-only grid: appends insert rows, so the tab is only as large as its log
+            ws = _ws(SHEET, f"Log {month}", LOG_HEADERS, rows=1)
+            SHEETS.fix_row_height(ws, LOG_ROW_PX)
+            SHEETS.append_rows(ws, chunk, flush=True)
+
+def rotate_log_sheet(refresh: bool = False) -> None:
+    """
+    Keep 'Log' bounded: once its grid passes LOG_MAX_ROWS, archive all but the
+    newest LOG_KEEP_ROWS rows and delete them (plus blank grid rows) in one call.
+    The size check uses worksheet metadata, so small logs cost no value reads.
+    """
+    global LOG_WS
+    if LOG_WS is None:
+        return  # Sheets not open (deferred and not reachable yet)
+    if refresh:
+        LOG_WS = SHEETS.call(SHEET.worksheet, "Log")
+        SHEETS.fix_row_height(LOG_WS, LOG_ROW_PX)
+    if LOG_WS.row_count <= LOG_MAX_ROWS:
+        return
+    # Log rows queued from here on stay queued until the deletes are in, so the
+    # blank tail computed from this read can't cover them
+    with SHEETS.hold(), SHEETS.appends_paused(LOG_WS):
+        LOG_WS = SHEETS.call(SHEET.worksheet, "Log")  # current grid size, not cached metadata
+        rows = SHEETS.get_all_values(LOG_WS)
+        grid = LOG_WS.row_count
+        move = rows[1:max(1, len(rows) - LOG_KEEP_ROWS)] if len(rows) - 1 > LOG_MAX_ROWS else []
+        reqs = []
+        if grid > len(rows):
+            # Blank tail left from the initial grid; trimming keeps the metadata check honest
+            reqs.append({"deleteDimension": {"range": {"sheetId": LOG_WS.id, "dimension": "ROWS",
+                                                       "startIndex": len(rows), "endIndex": grid}}})
+        if move:
+            archive_log_rows(move)  # raises before anything is deleted if archiving fails
+            reqs.append({"deleteDimension": {"range": {"sheetId": LOG_WS.id, "dimension": "ROWS",
+                                                       "startIndex": 1, "endIndex": 1 + len(move)}}})
+        if reqs:
+            SHEETS.batch_update(reqs)
+    if move:
+        sheet_log("INFO", "log", f"rotated {len(move)} row(s) to {LOG_ARCHIVE} archive")
+
+print("Functions 'archive_log_rows', 'rotate_log_sheet' loaded – log rotation ready.")
+
+SHEETS_OPEN_LOCK = threading.Lock()
+
+def open_sheets() -> None:
+    """
+    Open the workbook, ensure the 'Card Offers' and 'Log' tabs and rotate the
+    log; a no-op once done. Until it succeeds sheet_log() prints instead.
+    """
+    global SHEET, SHEETS, OFFER_WS, LOG_WS
+    with SHEETS_OPEN_LOCK:
+        if LOG_WS is not None:
+            return
+        try:
+            if SHEET is None:
+                SHEET = open_workbook()
+                SHEETS = SheetsClient(SHEET)
+            OFFER_WS = OFFER_WS or _ws(SHEET, "Card Offers", OFFER_HEADERS)
+            LOG_WS = _ws(SHEET, "Log", LOG_HEADERS)
+        except SystemExit as exc:  # credential lookup exits; a background opener must raise instead
+            raise RuntimeError(str(exc)) from None
+        set_log_row_height()
+    print("Worksheets ready – 'Card Offers' and 'Log' ensured.")
+    try:
+        rotate_log_sheet()
+    except Exception as exc:
+        print(f"[LOG_FAIL] log rotation skipped ({type(exc).__name__}: {exc})")
+
+def open_sheets_in_background() -> None:
+    """Deferred runs: try to open Sheets early so log rows reach it; the replica retries on its own."""
+    def _open() -> None:
+        try:
+            open_sheets()
+        except Exception as exc:
+            print(f"[SHEETS] workbook unavailable – logging to console ({type(exc).__name__}: {exc})")
+    threading.Thread(target=_open, name="sheets-open", daemon=True).start()
+
+print("Functions 'open_sheets', 'open_sheets_in_background' loaded – Sheets bootstrap ready.")
+if SHEETS_DEFERRED:
+    open_sheets_in_background()
+elif SHEET:
+    open_sheets()
+else:
+    print("Worksheets skipped.")
 print("Section 'Google Sheets bootstrap' complete – Sheets initialized.")
 
+# ---------------------------------------------------------------------------
+# Output sinks
+# ---------------------------------------------------------------------------
+
+class OfferSink(abc.ABC):
+    """A destination for rows under a fixed header (one sink per logical table)."""
+
+    def __init__(self, name: str, headers: Tuple[str, ...]):
+        self.name = name
+        self.headers = tuple(headers)
+        self._lock = threading.Lock()
+
+    @abc.abstractmethod
+    def write_rows(self, rows: List[List[str]]) -> None:
+        """Append rows; raising means none of them were written."""
+
+    @abc.abstractmethod
+    def existing_rows(self) -> List[List[str]]:
+        """All data rows (header excluded), in write order."""
+
+    def end_batch(self) -> None:
+        """A logical batch (one card) is complete; sinks may do per-batch upkeep."""
+
+    def sync(self, timeout: float = 120.0) -> bool:
+        """Wait for background work to land; True when nothing is outstanding."""
+        return True
+
+    def close(self) -> None:
+        pass
+
+class SheetsSink(OfferSink):
+    """
+    Write rows to a worksheet through SHEETS (synchronous). `on_write` (the
+    filter reset) runs once per batch from end_batch(), not after every chunk.
+    """
+
+    def __init__(self, name: str, headers: Tuple[str, ...], ws, on_write: Optional[Callable[[], None]] = None):
+        super().__init__(name, headers)
+        self.ws = ws
+        self.on_write = on_write
+        self._dirty = False
+
+    def write_rows(self, rows: List[List[str]]) -> None:
+        if not rows:
+            return
+        # Only the append may raise: the replicator retries failed writes, and a
+        # retry after a successful append would duplicate the rows
+        SHEETS.append_now(self.ws, rows)
+        self._dirty = True
+
+    def end_batch(self) -> None:
+        if not (self._dirty and self.on_write):
+            return
+        self._dirty = False
+        try:
+            self.on_write()
+        except Exception as exc:
+            print(f"[SHEETS] post-write hook for '{self.name}' failed ({type(exc).__name__}: {exc})")
+
+    def existing_rows(self) -> List[List[str]]:
+        return SHEETS.get_all_values(self.ws)[1:]
+
+class CsvSink(OfferSink):
+    """Append rows to a local CSV file (header written on first use)."""
+
+    def __init__(self, name: str, headers: Tuple[str, ...], path: Path):
+        super().__init__(name, headers)
+        self.path = path
+
+    def write_rows(self, rows: List[List[str]]) -> None:
+        if not rows:
+            return
+        with self._lock:
+            new_file = not self.path.exists() or self.path.stat().st_size == 0
+            with open(self.path, "a", newline="", encoding="utf-8") as fh:
+                w = csv.writer(fh)
+                if new_file:
+                    w.writerow(self.headers)
+                w.writerows(rows)
+
+    def existing_rows(self) -> List[List[str]]:
+        if not self.path.exists():
+            return []
+        with self._lock, open(self.path, newline="", encoding="utf-8") as fh:
+            return list(csv.reader(fh))[1:]
+
+class JsonlSink(OfferSink):
+    """Append rows to a local JSON-lines file, one {header: value} object per row."""
+
+    def __init__(self, name: str, headers: Tuple[str, ...], path: Path):
+        super().__init__(name, headers)
+        self.path = path
+
+    def write_rows(self, rows: List[List[str]]) -> None:
+        if not rows:
+            return
+        with self._lock, open(self.path, "a", encoding="utf-8") as fh:
+            for r in rows:
+                fh.write(json.dumps(dict(zip(self.headers, r)), ensure_ascii=False) + "\n")
+
+    def existing_rows(self) -> List[List[str]]:
+        if not self.path.exists():
+            return []
+        out = []
+        with self._lock, open(self.path, encoding="utf-8") as fh:
+            for line in fh:
+                if line.strip():
+                    obj = json.loads(line)
+                    out.append([obj.get(h, "") for h in self.headers])
+        return out
+
+class SqliteSink(OfferSink):
+    """Store rows in a local SQLite table named after the sink."""
+
+    def __init__(self, name: str, headers: Tuple[str, ...], path: Path):
+        super().__init__(name, headers)
+        self.table = re.sub(r"\W+", "_", name.lower()).strip("_")
+        self.conn = sqlite3.connect(str(path), check_same_thread=False)
+        cols = ", ".join(f'"{h}" TEXT' for h in self.headers)
+        self.conn.execute(f'CREATE TABLE IF NOT EXISTS "{self.table}" ({cols})')
+        self.conn.commit()
+
+    def write_rows(self, rows: List[List[str]]) -> None:
+        if not rows:
+            return
+        marks = ", ".join("?" for _ in self.headers)
+        with self._lock:
+            self.conn.executemany(f'INSERT INTO "{self.table}" VALUES ({marks})', [list(r) for r in rows])
+            self.conn.commit()
+
+    def existing_rows(self) -> List[List[str]]:
+        with self._lock:
+            return [list(r) for r in self.conn.execute(f'SELECT * FROM "{self.table}" ORDER BY rowid')]
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
+
+print("Classes 'OfferSink', 'SheetsSink', 'CsvSink', 'JsonlSink', 'SqliteSink' loaded – output sinks ready.")
+
+class SheetsReplicator:
+    """
+    Background thread that pushes rows to a Sheets sink. Failures are retried
+    with backoff; the local sink already holds the data, so nothing waits on it.
+    """
+
+    def __init__(self, target_factory: Callable[[], OfferSink]):
+        self._factory = target_factory
+        self._target: Optional[OfferSink] = None
+        self._q: "queue.Queue[Optional[List[List[str]]]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="sheets-replica", daemon=True)
+        self._thread.start()
+
+    END_BATCH: List[List[str]] = []  # queue marker: run the target's per-batch upkeep
+
+    def submit(self, rows: List[List[str]]) -> None:
+        if rows:
+            self._q.put([list(r) for r in rows])
+
+    def end_batch(self) -> None:
+        self._q.put(self.END_BATCH)
+
+    def _run(self) -> None:
+        delay = SHEETS_BACKOFF_BASE
+        while True:
+            rows = self._q.get()
+            try:
+                if rows is None:
+                    return
+                if rows is self.END_BATCH:
+                    if self._target is not None:
+                        self._target.end_batch()  # best effort; never re-sends rows
+                    continue
+                while True:
+                    try:
+                        if self._target is None:
+                            self._target = self._factory()
+                        self._target.write_rows(rows)
+                        delay = SHEETS_BACKOFF_BASE
+                        break
+                    except Exception as exc:
+                        print(f"[REPLICA] {len(rows)} row(s) pending – {type(exc).__name__}: {exc}; retry in {delay:.0f}s")
+                        time.sleep(delay)
+                        delay = min(SHEETS_BACKOFF_CAP, delay * 2)
+            finally:
+                self._q.task_done()
+
+    def pending(self) -> int:
+        return self._q.unfinished_tasks
+
+    def sync(self, timeout: float = 120.0) -> bool:
+        end = time.time() + timeout
+        while self.pending() and time.time() < end:
+            time.sleep(0.2)
+        return not self.pending()
+
+    def stop(self, timeout: float = 120.0) -> None:
+        if not self.sync(timeout):
+            print(f"[REPLICA] {self.pending()} batch(es) not replicated – rows remain in the local sink")
+        self._q.put(None)
+        self._thread.join(timeout=1.0)
+
+class ReplicatedSink(OfferSink):
+    """Local primary sink on the hot path, replicated to Sheets asynchronously."""
+
+    def __init__(self, primary: OfferSink, replicator: SheetsReplicator):
+        super().__init__(primary.name, primary.headers)
+        self.primary = primary
+        self.replicator = replicator
+
+    def write_rows(self, rows: List[List[str]]) -> None:
+        self.primary.write_rows(rows)
+        self.replicator.submit(rows)
+
+    def existing_rows(self) -> List[List[str]]:
+        return self.primary.existing_rows()
+
+    def end_batch(self) -> None:
+        self.primary.end_batch()
+        self.replicator.end_batch()
+
+    def sync(self, timeout: float = 120.0) -> bool:
+        return self.replicator.sync(timeout)
+
+    def close(self) -> None:
+        self.replicator.stop()
+        self.primary.close()
+
+print("Classes 'SheetsReplicator', 'ReplicatedSink' loaded – background Sheets replica ready.")
+
+def build_sink(name: str, headers: Tuple[str, ...], ws_getter: Callable[[], Any],
+               on_sheet_write: Optional[Callable[[], None]] = None) -> OfferSink:
+    """Create the sink selected by CITI_OUTPUT_SINK for one logical table."""
+    def sheets() -> OfferSink:
+        open_sheets()  # deferred runs: the replica is usually first to need the workbook
+        return SheetsSink(name, headers, ws_getter(), on_sheet_write)
+
+    if OUTPUT_SINK == "sheets":
+        return sheets()
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    stem = re.sub(r"\W+", "_", name.lower()).strip("_")
+    if OUTPUT_SINK == "csv":
+        local: OfferSink = CsvSink(name, headers, OUTPUT_DIR / f"{stem}.csv")
+    elif OUTPUT_SINK == "jsonl":
+        local = JsonlSink(name, headers, OUTPUT_DIR / f"{stem}.jsonl")
+    elif OUTPUT_SINK == "sqlite":
+        local = SqliteSink(name, headers, OUTPUT_DIR / "offers.sqlite3")
+    else:
+        sys.exit(f"Unknown CITI_OUTPUT_SINK '{OUTPUT_SINK}' – use sheets, csv, jsonl or sqlite")
+    return ReplicatedSink(local, SheetsReplicator(sheets)) if SHEETS_REPLICA else local
+
+print("Function 'build_sink' loaded – sink factory ready.")
+
+# reset_filters_full_range is defined under 'Sheet maintenance'; resolved at call time
+OUTPUT = build_sink("Card Offers", OFFER_HEADERS, lambda: OFFER_WS,
+                    on_sheet_write=lambda: reset_filters_full_range())
+
+INVENTORY_HEADERS = (
+    "Snapshot", "Card Holder", "Last Four", "Card Name", "Brand",
+    "Discount", "Expiration", "Enrolled"
+)
+INVENTORY = (build_sink("Offer Inventory", INVENTORY_HEADERS,
+                        lambda: _ws(SHEET, "Offer Inventory", INVENTORY_HEADERS))
+             if CLI.scan_only else None)
+print("Section 'output sinks' complete – offer output ready.")
+
+# ---------------------------------------------------------------------------
+# Watchdog & run report
+# ---------------------------------------------------------------------------
+
+RUN_REPORT: Dict[str, Any] = {
+    "started": datetime.now().isoformat(timespec="seconds"),
+    "worker": WORKER_ID,
+    "events": [],
+    "resources": [],
+}
+RUN_REPORT_LOCK = threading.Lock()
+COMMAND_STATS: Dict[str, List[float]] = {}  # WebDriver command -> [count, seconds]
+
+def report_event(kind: str, **fields: Any) -> None:
+    """Append one event (watchdog breach, driver restart, account result, ...) to the run report."""
+    with RUN_REPORT_LOCK:
+        RUN_REPORT["events"].append({"time": datetime.now().isoformat(timespec="seconds"), "kind": kind, **fields})
+
+def write_run_report() -> None:
+    """Persist the run report (best effort, like the nav stats)."""
+    try:
+        with RUN_REPORT_LOCK:
+            RUN_REPORT["finished"] = datetime.now().isoformat(timespec="seconds")
+            RUN_REPORT["commands"] = {name: {"count": int(n), "secs": round(secs, 3)}
+                                      for name, (n, secs) in sorted(COMMAND_STATS.items())}
+            RUN_REPORT_PATH.parent.mkdir(parents=True, exist_ok=True)
+            tmp = RUN_REPORT_PATH.with_suffix(".tmp")
+            with open(tmp, "w", encoding="utf-8") as fh:
+                json.dump(RUN_REPORT, fh, indent=2)
+        os.replace(tmp, RUN_REPORT_PATH)
+        print(f"Run report written to {RUN_REPORT_PATH}.")
+    except Exception as exc:
+        print(f"[RUN_REPORT] save failed ({type(exc).__name__}: {exc})")
+
+print("Functions 'report_event', 'write_run_report' loaded – run report ready.")
+
+class DeadlineExceeded(BaseException):
+    """
+    Raised on the browser thread once the watchdog has killed a hung driver.
+    Derives from BaseException so the broad `except Exception` heals in the
+    page helpers can't swallow it; run_card/run_one_account recover from it.
+    """
+
+    def __init__(self, kind: str, label: str, secs: float, what: str = "deadline exceeded"):
+        super().__init__(f"{kind} {what} ({label}, {secs:.0f}s)")
+        self.kind, self.label, self.secs = kind, label, secs
+
+class Watchdog:
+    """
+    Background thread enforcing COMMAND_DEADLINE on every WebDriver command and
+    per-phase deadlines (card, account). On a breach it kills chromedriver –
+    which unblocks the hung call – and every later command raises
+    DeadlineExceeded until restart_driver() clears the trip.
+    """
+
+    def __init__(self, poll: float = 1.0):
+        self._lock = threading.Lock()
+        self._phases: List[list] = []                   # [kind, label, deadline, started]
+        self._command: Optional[Tuple[str, float]] = None
+        self.tripped: Optional[DeadlineExceeded] = None
+        self._poll = poll
+        threading.Thread(target=self._run, name="watchdog", daemon=True).start()
+
+    @contextmanager
+    def phase(self, kind: str, label: str, secs: float) -> Iterator[None]:
+        entry = [kind, label, time.monotonic() + secs, time.monotonic()]
+        with self._lock:
+            self._phases.append(entry)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._phases.remove(entry)
+
+    def command_started(self, name: str) -> None:
+        if self.tripped and name != "quit":
+            raise self.tripped
+        self._command = (name, time.monotonic())
+
+    def command_finished(self) -> None:
+        self._command = None
+
+    def reset(self) -> None:
+        self.tripped = None
+        self._command = None
+
+    def abort(self, breach: DeadlineExceeded) -> None:
+        """Trip from another thread (e.g. a lost queue lease) and kill the browser."""
+        if self.tripped:
+            return
+        self.tripped = breach
+        print(f"[WATCHDOG] {breach} – killing browser.")
+        report_event("watchdog", deadline=breach.kind, label=breach.label, secs=round(breach.secs, 1))
+        if driver is not None:
+            kill_driver(driver)
+
+    def _breach(self) -> Optional[DeadlineExceeded]:
+        now = time.monotonic()
+        with self._lock:
+            cmd = self._command
+            if cmd and now - cmd[1] > COMMAND_DEADLINE:
+                return DeadlineExceeded("command", cmd[0], now - cmd[1])
+            for kind, label, deadline, started in self._phases:
+                if now > deadline:
+                    return DeadlineExceeded(kind, label, now - started)
+        return None
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self._poll)
+            if self.tripped or driver is None:
+                continue
+            breach = self._breach()
+            if breach:
+                self.abort(breach)
+
+WATCHDOG = Watchdog()
+print("Class 'Watchdog' loaded – command and phase deadlines armed.")
+
+def driver_processes(drv: Optional[webdriver.Chrome]) -> List["psutil.Process"]:
+    """chromedriver plus every Chrome process it spawned ([] without psutil)."""
+    if psutil is None or drv is None:
+        return []
+    try:
+        root = psutil.Process(drv.service.process.pid)
+        return [root] + root.children(recursive=True)
+    except Exception:
+        return []
+
+class ResourceMonitor:
+    """
+    Samples the browser between accounts – process-tree RSS and handle count
+    (psutil, when installed) plus a round-trip probe latency – and decides
+    whether the driver should be recycled. The latency baseline is probed on
+    each fresh browser, before any account has loaded it. Samples go to
+    RUN_REPORT.
+    """
+
+    def __init__(self):
+        self.baseline_ms: Optional[float] = None
+        self.accounts = 0  # accounts served by the current browser
+
+    @staticmethod
+    def probe_ms(drv: Optional[webdriver.Chrome]) -> Optional[float]:
+        """Mean round-trip of a trivial script over three calls; None if the driver doesn't answer."""
+        try:
+            t0 = time.perf_counter()
+            for _ in range(3):
+                drv.execute_script("return document.readyState;")
+            return (time.perf_counter() - t0) / 3 * 1000
+        except Exception:
+            return None
+
+    def driver_started(self, drv: webdriver.Chrome) -> None:
+        """Called by build_driver on every new browser."""
+        self.baseline_ms = self.probe_ms(drv)
+        self.accounts = 0
+
+    def sample(self, label: str) -> dict:
+        self.accounts += 1
+        rss = handles = 0
+        procs = driver_processes(driver)
+        for proc in procs:
+            try:
+                rss += proc.memory_info().rss
+                handles += proc.num_handles() if hasattr(proc, "num_handles") else proc.num_fds()
+            except Exception:
+                pass  # child exited between listing and sampling
+        latency_ms = self.probe_ms(driver)
+        sample = {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "after": label,
+            "accounts": self.accounts,
+            "processes": len(procs),
+            "rss_mb": round(rss / 2**20, 1) if procs else None,
+            "handles": handles if procs else None,
+            "latency_ms": round(latency_ms, 1) if latency_ms is not None else None,
+        }
+        with RUN_REPORT_LOCK:
+            RUN_REPORT["resources"].append(sample)
+        return sample
+
+    def over_threshold(self, sample: dict) -> Optional[str]:
+        """Reason to recycle the browser, or None while it's still healthy."""
+        if sample["latency_ms"] is None:
+            return "driver unresponsive"
+        if sample["rss_mb"] is not None and sample["rss_mb"] > RECYCLE_RSS_MB:
+            return f"RSS {sample['rss_mb']:.0f} MB > {RECYCLE_RSS_MB:.0f} MB"
+        if sample["handles"] is not None and sample["handles"] > RECYCLE_HANDLES:
+            return f"{sample['handles']} handles > {RECYCLE_HANDLES}"
+        if self.baseline_ms and sample["latency_ms"] > RECYCLE_LATENCY_X * max(self.baseline_ms, 5.0):
+            return f"latency {sample['latency_ms']:.0f} ms vs {self.baseline_ms:.0f} ms baseline"
+        if self.accounts >= RECYCLE_MAX_ACCOUNTS:
+            return f"{self.accounts} accounts on one browser"
+        return None
+
+MONITOR = ResourceMonitor()
+
+def recycle_reason(label: str) -> Optional[str]:
+    """Sample after account `label`; why the browser should restart before the next one (None = keep it)."""
+    sample = MONITOR.sample(label)
+    if RESTART_MODE == "true":
+        return "between accounts"
+    if RESTART_MODE == "auto":
+        return MONITOR.over_threshold(sample)
+    return None
+
+print("Class 'ResourceMonitor' and function 'recycle_reason' loaded – resource-aware recycling ready.")
+
 # ---------------------------------------------------------------------------
 # Selenium driver
 # ---------------------------------------------------------------------------
 
+def watch_commands(drv: webdriver.Chrome) -> None:
+    """Route every WebDriver command of `drv` through the watchdog and COMMAND_STATS."""
+    inner = drv.execute
+
+    def execute(command: str, params: Optional[dict] = None):
+        WATCHDOG.command_started(command)
+        t0 = time.perf_counter()
+        try:
+            return inner(command, params)
+        finally:
+            WATCHDOG.command_finished()
+            stat = COMMAND_STATS.setdefault(command, [0, 0.0])
+            stat[0] += 1
+            stat[1] += time.perf_counter() - t0
+
+    drv.execute = execute
+
+def kill_driver(drv: Optional[webdriver.Chrome]) -> None:
+    """Hard-stop chromedriver (and its Chrome tree, with psutil) without the possibly hung WebDriver protocol."""
+    for proc in reversed(driver_processes(drv)):
+        try:
+            proc.kill()
+        except Exception:
+            pass
+    try:
+        drv.service.process.kill()
+    except Exception:
+        pass
+
 def build_driver() -> Tuple[webdriver.Chrome, WebDriverWait]:
     """Create a Chrome driver and a WebDriverWait helper."""
     opts = Options()
     opts.add_argument("--start-maximized")
     drv = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=opts)
+    watch_commands(drv)
+    drv.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
     try:
         drv.set_window_position(*SECOND_MONITOR_OFFSET)
     except Exception:
         pass
     # small settle so first navigation isn't “too fast”
     time.sleep(NEW_WINDOW_SETTLE_PAUSE)
+    MONITOR.driver_started(drv)  # latency baseline from the still-blank browser
     return drv, WebDriverWait(drv, 30)
 
-print("Function 'build_driver' loaded – Selenium driver factory ready.")
+print("Functions 'watch_commands', 'kill_driver', 'build_driver' loaded – Selenium driver factory ready.")
 
-driver, wait = build_driver()
+driver, wait = build_driver() if NEEDS_BROWSER else (None, None)
 print("Section 'Selenium driver' complete – driver and wait initialized.")
 
-def restart_driver():
-    """Fully restart the browser between accounts (keeps sessions clean)."""
+def restart_driver(reason: str = "between accounts"):
+    """Fully restart the browser (between accounts, or after a watchdog kill)."""
     global driver, wait
-    try:
-        driver.quit()
-    except Exception:
-        pass
+    if WATCHDOG.tripped:
+        kill_driver(driver)  # already dead; don't wait on quit()
+    else:
+        try:
+            driver.quit()
+        except Exception:
+            pass
+    WATCHDOG.reset()
     driver, wait = build_driver()
+    report_event("driver_restart", reason=reason)
     print("Browser restarted – new driver instance created.")
 
 print("Function 'restart_driver' loaded – between-account isolation ready.")
@@ -263,8 +1443,11 @@ def page_not_found_visible() -> bool:
 
 print("Function 'page_not_found_visible' loaded – 404 detector ready.")
 
-def click_no_thanks_if_present(timeout: int = 5) -> bool:
-    """Dismiss common popups that block clicks (“No thanks”, “Not now”, etc.)."""
+def click_no_thanks_if_present(timeout: float = 5) -> bool:
+    """
+    Dismiss common popups that block clicks (“No thanks”, “Not now”, etc.),
+    polling for up to `timeout` seconds; timeout=0 checks once and returns.
+    """
     end = time.time() + timeout
     sels = [
         "//*[self::a or self::button][contains(translate(normalize-space(.),'ABCDEFGHIJKLMNOPQRSTUVWXYZ','abcdefghijklmnopqrstuvwxyz'),'no thanks')]",
@@ -274,7 +1457,7 @@ def click_no_thanks_if_present(timeout: int = 5) -> bool:
         "//*[@role='dialog']//button[@aria-label='Close' or contains(@class,'close')]",
         "//button[@aria-label='Close' or contains(@class,'close')]",
     ]
-    while time.time() < end:
+    while True:
         clicked = False
         for xp in sels:
             for el in driver.find_elements(By.XPATH, xp):
@@ -287,8 +1470,9 @@ def click_no_thanks_if_present(timeout: int = 5) -> bool:
                         pass
         if clicked:
             return True
+        if time.time() >= end:
+            return False
         time.sleep(0.2)
-    return False
 
 print("Function 'click_no_thanks_if_present' loaded – popup dismissor ready.")
 
@@ -395,65 +1579,132 @@ def robust_get(url: str, tries: int = 2) -> None:
 
 print("Function 'robust_get' loaded – guarded navigation helper ready.")
 
-def goto_offers_page(max_tries: int = OFFERS_RETRY_MAX) -> bool:
-    """Reach Merchant Offers reliably, healing 404s / unauthorized / slow loads."""
+def load_nav_stats() -> Dict[str, Dict[str, List[list]]]:
+    """Read {account: {strategy: [[epoch, ok, seconds], ...]}} from the stats file."""
+    try:
+        with open(NAV_STATS_PATH, encoding="utf-8") as fh:
+            data = json.load(fh)
+        return data if isinstance(data, dict) else {}
+    except Exception:
+        return {}
+
+def save_nav_stats(stats: Dict[str, Dict[str, List[list]]]) -> None:
+    """Persist nav stats (best effort – never blocks navigation)."""
+    try:
+        tmp = NAV_STATS_PATH.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(stats, fh)
+        os.replace(tmp, NAV_STATS_PATH)
+    except Exception as exc:
+        print(f"[NAV_STATS] save failed ({type(exc).__name__}: {exc})")
+
+def record_nav_result(stats: dict, account: str, strategy: str, ok: bool, secs: float) -> None:
+    """Append one outcome, keeping only the most recent NAV_STATS_KEEP samples."""
+    samples = stats.setdefault(account, {}).setdefault(strategy, [])
+    samples.append([int(time.time()), bool(ok), round(secs, 2)])
+    del samples[:-NAV_STATS_KEEP]
+
+def nav_strategy_order(stats: dict, account: str, defaults: List[str],
+                       attempt: int, max_tries: int) -> List[str]:
+    """
+    Order strategies by expected time-to-success (mean seconds / success rate).
+    Strategies without enough history keep their default ladder position after
+    the proven ones; ones that rarely help are skipped except on the final try.
+    """
+    history = stats.get(account, {})
+    proven: List[Tuple[float, str]] = []
+    untried: List[str] = []
+    for name in defaults:
+        samples = history.get(name, [])
+        if len(samples) < NAV_STATS_MIN_SAMPLES:
+            untried.append(name)
+            continue
+        rate = sum(1 for _, ok, _ in samples if ok) / len(samples)
+        if rate < NAV_SKIP_BELOW and attempt < max_tries:
+            continue
+        mean_secs = sum(secs for _, _, secs in samples) / len(samples)
+        proven.append((mean_secs / max(rate, 0.01), name))
+    return [name for _, name in sorted(proven)] + untried
+
+print("Functions 'load_nav_stats', 'save_nav_stats', 'record_nav_result', 'nav_strategy_order' loaded – adaptive nav stats ready.")
+
+def goto_offers_page(max_tries: int = OFFERS_RETRY_MAX, account: str = "") -> bool:
+    """
+    Reach Merchant Offers reliably, healing 404s / unauthorized / slow loads.
+    Strategy order adapts to per-account history in NAV_STATS_PATH.
+    """
 
     def on_offers() -> bool:
         return ("merchantoffers" in driver.current_url) and (offers_ready() or not error_toast_visible())
 
-    for attempt in range(1, max_tries + 1):
-        clear_web_storage()
-        if return_to_account_if_404():
-            time.sleep(1.0)
-
+    def via_direct() -> bool:
         # Direct URL first (Citi often needs two hits)
         try:
             robust_get(OFFERS_URL, tries=2)
         except Exception as exc:
             sheet_log("WARN", "nav", f"direct offers get failed (try {attempt}): {exc}")
-
         try:
             WebDriverWait(driver, 12).until(
                 lambda _: offers_ready() or error_banner_visible() or error_toast_visible() or page_not_found_visible()
             )
         except Exception:
             pass
+        return on_offers()
 
-        if on_offers():
-            sheet_log("INFO", "nav", f"offers ready (direct, try {attempt})")
-            return True
-
+    def via_menu() -> bool:
         # In-app menu fallback keeps context
-        used_menu = False
-        if NAV_MENU_FALLBACK and nav_via_rewards_menu():
-            used_menu = True
-            try:
-                WebDriverWait(driver, 12).until(
-                    lambda _: offers_ready() or error_banner_visible() or error_toast_visible()
-                )
-            except Exception:
-                pass
-            if on_offers():
-                sheet_log("INFO", "nav", f"offers ready (menu, try {attempt})")
-                return True
+        if not nav_via_rewards_menu():
+            return False
+        try:
+            WebDriverWait(driver, 12).until(
+                lambda _: offers_ready() or error_banner_visible() or error_toast_visible()
+            )
+        except Exception:
+            pass
+        return on_offers()
 
-        # Later attempts: home then back
-        if attempt >= 3:
-            go_home_then_back()
-            if on_offers():
-                sheet_log("INFO", "nav", f"offers ready (home-bridge, try {attempt})")
-                return True
+    def via_home_bridge() -> bool:
+        go_home_then_back()
+        return on_offers()
 
+    def via_refresh() -> bool:
         # Gentle refresh as a nudge
         driver.refresh()
         time.sleep(PAGE_LOAD_PAUSE)
-        if on_offers():
-            src = "menu" if used_menu else "refresh"
-            sheet_log("INFO", "nav", f"offers ready ({src}, try {attempt})")
-            return True
+        return on_offers()
+
+    strategies: Dict[str, Callable[[], bool]] = {"direct": via_direct}
+    if NAV_MENU_FALLBACK:
+        strategies["menu"] = via_menu
+    strategies["home-bridge"] = via_home_bridge
+    strategies["refresh"] = via_refresh
 
-        sheet_log("WARN", "nav", f"offers not ready – retrying ({attempt}/{max_tries})")
-        time.sleep(1.0)
+    key = account or "default"
+    stats = load_nav_stats()
+    try:
+        for attempt in range(1, max_tries + 1):
+            clear_web_storage()
+            if return_to_account_if_404():
+                time.sleep(1.0)
+
+            for name in nav_strategy_order(stats, key, list(strategies), attempt, max_tries):
+                history = stats.get(key, {}).get(name, [])
+                # Without a track record the home bridge is a late-attempt step
+                if name == "home-bridge" and attempt < 3 and len(history) < NAV_STATS_MIN_SAMPLES:
+                    continue
+                t0 = time.time()
+                ok = strategies[name]()
+                record_nav_result(stats, key, name, ok, time.time() - t0)
+                if ok:
+                    sheet_log("INFO", "nav", f"offers ready ({name}, try {attempt})")
+                    if RECORDER:
+                        RECORDER.landing(account)
+                    return True
+
+            sheet_log("WARN", "nav", f"offers not ready – retrying ({attempt}/{max_tries})")
+            time.sleep(1.0)
+    finally:
+        save_nav_stats(stats)
 
     sheet_log("ERROR", "nav", "could not reach merchant offers after login")
     return False
@@ -584,6 +1835,8 @@ print("Function 'login_once' loaded – single-attempt login ready.")
 
 def citi_login(username: str, password: str) -> bool:
     """Resilient login with a couple of speeds; tiny pause after success."""
+    if REPLAY_DIR:
+        return True  # the fixture server is the whole site; there is nothing to log into
     ensure_login_context(pre_wait=3, max_wait=20)
     for attempt, pause in enumerate((0.1, 0.5, 1.0), start=1):
         login_once(username, password, pause)
@@ -604,6 +1857,8 @@ print("Function 'citi_login' loaded – resilient login flow ready.")
 
 def citi_logout() -> None:
     """Log out and clear cookies to isolate sessions."""
+    if REPLAY_DIR:
+        return
     try:
         driver.get("https://online.citi.com/US/logout")
         time.sleep(3)
@@ -626,25 +1881,62 @@ def plus_icons():
 
 print("Function 'plus_icons' loaded – enroll icon locator ready.")
 
-def expand_all():
-    """Click 'Show more'/'Load more' until all offers are visible."""
-    while True:
-        btns = [b for b in driver.find_elements(
-            By.XPATH,
-            "//button[contains(translate(.,'ABCDEFGHIJKLMNOPQRSTUVWXYZ','abcdefghijklmnopqrstuvwxyz'),'show more') "
-            "or contains(translate(.,'ABCDEFGHIJKLMNOPQRSTUVWXYZ','abcdefghijklmnopqrstuvwxyz'),'load more')]"
-        ) if b.is_displayed()]
-        if not btns:
-            break
-        for btn in btns:
-            try:
-                driver.execute_script("arguments[0].scrollIntoView({block:'center'});", btn)
-                driver.execute_script("arguments[0].click();", btn)
-                time.sleep(0.3)
-            except Exception as exc:
-                sheet_log("ERROR", "expand", f"{type(exc).__name__}: {exc}")
-        time.sleep(0.3)
-    WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.XPATH, "//div[contains(@class,'offer-tile')]")))
+# Runs inside the page: click load-more buttons and scroll until the tile count
+# stops growing, then hand back the count and the unenrolled tile IDs in one go.
+# Tile identity shared by the live page, the recorder and the replay shim: the
+# tile's own id attributes, else its position among all offer tiles.
+TILE_ID_JS = """
+function tileId(t) {
+  return t.id || t.getAttribute('data-testid') || t.getAttribute('data-offer-id') ||
+         ('tile-' + Array.prototype.indexOf.call(document.querySelectorAll("div[class*='offer-tile']"), t));
+}
+"""
+EXPAND_ALL_JS = TILE_ID_JS + """
+var done = arguments[arguments.length - 1];
+var deadline = Date.now() + arguments[0];
+var pause = arguments[1], stableNeeded = arguments[2];
+var last = -1, stable = 0;
+function tiles() { return document.querySelectorAll("div[class*='offer-tile']"); }
+function moreButtons() {
+  return Array.prototype.filter.call(document.querySelectorAll('button'), function (b) {
+    var t = (b.textContent || '').toLowerCase();
+    return (t.indexOf('show more') >= 0 || t.indexOf('load more') >= 0) && b.offsetParent !== null;
+  });
+}
+function finish() {
+  var ids = [];
+  Array.prototype.forEach.call(tiles(), function (t) {
+    if (t.querySelector("cds-icon[name='plus-circle'][arialabel='Enroll']")) {
+      ids.push(tileId(t));
+    }
+  });
+  window.scrollTo(0, 0);
+  done({count: tiles().length, unenrolled: ids});
+}
+(function step() {
+  var btns = moreButtons();
+  btns.forEach(function (b) { try { b.scrollIntoView({block: 'center'}); b.click(); } catch (e) {} });
+  window.scrollTo(0, document.body.scrollHeight);
+  var n = tiles().length;
+  stable = (n > 0 && n === last && !btns.length) ? stable + 1 : 0;
+  last = n;
+  if (stable >= stableNeeded || Date.now() > deadline) { finish(); return; }
+  setTimeout(step, pause);
+})();
+"""
+
+def expand_all() -> Tuple[int, List[str]]:
+    """
+    Expand the grid in one async script call (no per-button round trips).
+    Returns (tile count, unenrolled tile IDs); raises TimeoutException when no
+    tiles ever show up so callers can heal the page.
+    """
+    driver.set_script_timeout(EXPAND_TIMEOUT + 5)
+    res = driver.execute_async_script(EXPAND_ALL_JS, int(EXPAND_TIMEOUT * 1000), 300, 3) or {}
+    count = int(res.get("count") or 0)
+    if not count:
+        raise TimeoutException("No offer tiles after expanding")
+    return count, list(res.get("unenrolled") or [])
 
 print("Function 'expand_all' loaded – offer list expander ready.")
 
@@ -738,6 +2030,16 @@ def open_card_dropdown() -> None:
 def get_label_text() -> str:
     return wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, CARD_LABEL_CSS))).text.strip()
 
+def select_card(label: str, settle: bool = True) -> None:
+    """Pick a card in the dropdown; with settle=False just kick off the switch."""
+    if get_label_text() == label:
+        return
+    open_card_dropdown()
+    wait.until(EC.element_to_be_clickable((By.XPATH, f"{OPT_DROPD_X}[normalize-space()='{label}']"))).click()
+    if settle:
+        WebDriverWait(driver, 10).until(lambda _: get_label_text() == label)
+        time.sleep(SWITCH_CARD_SETTLE_PAUSE)  # give the UI a second
+
 print("Card dropdown helpers ready.")
 
 def heal_offers_page(label_to_reselect: Optional[str] = None, tries: int = 3) -> bool:
@@ -782,12 +2084,15 @@ CARD_LINE_XPATH = (
 
 CARD_LAST4_RE = re.compile(r"(?:\*\*|\b|-|\s)(\d{4})\b")
 def card_name_and_last4_from_modal() -> Tuple[str, str]:
+    """Read the page text and extract card name / last 4 from the open modal."""
+    return card_name_and_last4_from_text(driver.find_element(By.TAG_NAME, "body").text)
+
+def card_name_and_last4_from_text(modal_text: str) -> Tuple[str, str]:
     """
     Citi modals usually include something like:
     "Offer For  Citi Strata℠ Card – 8549"
     We'll try to extract a readable card name and the last 4.
     """
-    modal_text = driver.find_element(By.TAG_NAME, "body").text
     # crude but reliable: look for a line that mentions "Offer For" or "Card - "
     name = ""
     last4 = ""
@@ -829,42 +2134,235 @@ def dismiss_enrollment_error_if_present() -> None:
     except Exception:
         pass
 
+def split_card_label(label: str) -> Tuple[str, str]:
+    """'Citi Strata Card - 8549' -> ('Citi Strata Card', '8549')."""
+    card, last4 = [s.strip() for s in label.rsplit("-", 1)] if "-" in label else (label, "")
+    return card.replace("Products & Offers", "").strip(), last4
+
+# Reads brand/discount/expiration straight from an offer-tile element (no modal)
+TILE_PARSE_JS = TILE_ID_JS + """
+function parseTile(t) {
+  if (!t) return null;
+  function txt(sel) { var el = t.querySelector(sel); return el ? (el.innerText || el.textContent || '').trim() : ''; }
+  var all = (t.innerText || t.textContent || '').trim();
+  var lines = all.split(/\\n+/).map(function (x) { return x.trim(); }).filter(Boolean);
+  var img = t.querySelector('img[alt]');
+  var brand = txt("[class*='merchant-name']") || txt("[class*='merchant']")
+              || (img ? img.getAttribute('alt').trim() : '') || lines[0] || '';
+  var discount = txt("[class*='offer-title']") || '';
+  if (!discount) {
+    for (var i = 0; i < lines.length; i++) {
+      if (/(\\d+%|\\$\\d+)/.test(lines[i]) && /(back|off|cash)/i.test(lines[i])) { discount = lines[i]; break; }
+    }
+  }
+  var m = all.match(/(?:exp(?:ires|iration)?\\.?|ends|valid through)[:\\s]*([A-Za-z]{3,9}\\.? \\d{1,2},? \\d{4}|\\d{1,2}\\/\\d{1,2}\\/\\d{2,4})/i);
+  return {
+    id: tileId(t),
+    brand: brand, discount: discount, expiration: m ? m[1] : '',
+    enrolled: !t.querySelector("cds-icon[name='plus-circle'][arialabel='Enroll']")
+  };
+}
+"""
+TILE_AT_ICON_JS = TILE_PARSE_JS + """
+return parseTile(arguments[0].closest("div[class*='offer-tile']"));
+"""
+SCAN_TILES_JS = TILE_PARSE_JS + """
+return Array.prototype.filter.call(document.querySelectorAll("div[class*='offer-tile']"), function (t) {
+  return !(t.parentElement && t.parentElement.closest("div[class*='offer-tile']"));  // outermost tiles only
+}).map(parseTile);
+"""
+
+# --- Cross-card cache of parsed offer terms ---
+# The same merchant offer shows up on several cards/holders; key it on what the
+# tile shows so repeat offers skip the modal reads and regex parsing.
+TERMS_CACHE: Dict[str, dict] = {}
+
+def terms_cache_key(tile: Optional[dict]) -> Optional[str]:
+    """'brand|discount|expiration' from a parsed tile, or None if the tile is too vague."""
+    if not tile or not tile.get("brand") or not tile.get("discount"):
+        return None
+    # Without a parseable expiry, renewals and same-merchant offers would share terms
+    d = try_parse_date_any(tile.get("expiration") or "")
+    if not d:
+        return None
+    exp = d.strftime("%b %d, %Y")
+    return "|".join(re.sub(r"\s+", " ", v).strip().lower() for v in (tile["brand"], tile["discount"], exp))
+
+def load_terms_cache() -> None:
+    """Seed TERMS_CACHE from CITI_TERMS_CACHE_FILE, dropping expired offers."""
+    if not TERMS_CACHE_FILE:
+        return
+    try:
+        with open(PROJECT_ROOT / TERMS_CACHE_FILE, encoding="utf-8") as fh:
+            data = json.load(fh)
+    except Exception:
+        return
+    today = date.today()
+    for key, terms in data.items():
+        d = try_parse_date_any(terms.get("exp", ""))
+        if not d or d >= today:
+            TERMS_CACHE[key] = terms
+
+def save_terms_cache() -> None:
+    """Persist TERMS_CACHE when a cache file is configured (best effort)."""
+    if not TERMS_CACHE_FILE:
+        return
+    try:
+        path = PROJECT_ROOT / TERMS_CACHE_FILE
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(TERMS_CACHE, fh)
+        os.replace(tmp, path)
+    except Exception as exc:
+        print(f"[TERMS_CACHE] save failed ({type(exc).__name__}: {exc})")
+
+load_terms_cache()
+print(f"Terms cache ready – {len(TERMS_CACHE)} cached offer(s).")
+
+# --- Parse/persist pipeline ---
+def build_offer_row(p: dict) -> List[str]:
+    """
+    Turn a raw offer payload into a sheet row. Payloads carry either cached
+    `terms` or the raw modal texts (brand, disc, body, exp_raw, page_text).
+    """
+    terms = p.get("terms")
+    if not terms:
+        body = p.get("body", "")
+        terms = {
+            "brand": p.get("brand", "Unknown Brand"),
+            "disc": p.get("disc", ""),
+            "maxd": parse_max_disc(body) or "",
+            "mins": parse_min_spend(body) or "None",
+            "exp": normalize_expiration_string(p.get("exp_raw", "")),
+            "local": "Yes" if "philadelphia" in body.lower() else "No",
+        }
+        if p.get("cache_key"):
+            TERMS_CACHE[p["cache_key"]] = terms
+    card, last4 = p.get("card", ""), p.get("last4", "")
+    if p.get("page_text") and not (card and last4):
+        # Backfill card & last4 from modal if dropdown label was missing/lying
+        card_guess, last4_guess = card_name_and_last4_from_text(p["page_text"])
+        card, last4 = card or card_guess, last4 or last4_guess
+    added = datetime.today().strftime("%m/%d/%Y")
+    return [p["holder"], last4, card or "Citi Card", terms["brand"], terms["disc"],
+            terms["maxd"], terms["mins"], added, terms["exp"], terms["local"]]
+
+class OfferPipeline:
+    """
+    Bounded hand-off between the Selenium thread and parse/persist workers.
+    The browser thread only submits raw payloads (blocking when the queue is
+    full); workers build rows, dedupe against `seen` and write them to OUTPUT
+    in chunks of PIPELINE_FLUSH_ROWS while the browser keeps enrolling.
+    """
+
+    def __init__(self, seen: Set[Tuple], label: str = ""):
+        self.seen = seen
+        self.label = label
+        self.written = 0
+        self._rows: List[List[str]] = []
+        self._lock = threading.Lock()
+        self._q: "queue.Queue[Optional[dict]]" = queue.Queue(maxsize=PIPELINE_QUEUE)
+        self._threads = [threading.Thread(target=self._work, name=f"offer-parse-{i}", daemon=True)
+                         for i in range(PIPELINE_WORKERS)]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, payload: dict) -> None:
+        self._q.put(payload)
+
+    def _work(self) -> None:
+        while True:
+            payload = self._q.get()
+            if payload is None:
+                return
+            try:
+                row = build_offer_row(payload)
+                chunk = None
+                with self._lock:
+                    if tuple(row) not in self.seen:
+                        self.seen.add(tuple(row))
+                        self._rows.append(row)
+                    if len(self._rows) >= PIPELINE_FLUSH_ROWS:
+                        chunk, self._rows = self._rows, []
+                if chunk:
+                    self._write(chunk)
+            except Exception as exc:
+                sheet_log("ERROR", "pipeline", f"{self.label}: {type(exc).__name__}: {exc}")
+
+    def _write(self, rows: List[List[str]]) -> None:
+        try:
+            OUTPUT.write_rows(rows)
+            self.written += len(rows)
+        except Exception as exc:
+            sheet_log("ERROR", "write_rows", f"{type(exc).__name__}: {exc}")
+            return
+        try:
+            index_add_rows(rows)
+        except Exception as exc:
+            print(f"[INDEX] update failed ({type(exc).__name__}: {exc})")
+
+    def close(self) -> int:
+        """Drain the queue, stop workers and write the remainder; returns rows written."""
+        for _ in self._threads:
+            self._q.put(None)
+        for t in self._threads:
+            t.join()
+        with self._lock:
+            chunk, self._rows = self._rows, []
+        if chunk:
+            self._write(chunk)
+        if self.written:
+            try:
+                OUTPUT.end_batch()  # Sheets sink: one filter reset per card, not per chunk
+            except Exception as exc:
+                sheet_log("ERROR", "write_rows", f"end of batch: {type(exc).__name__}: {exc}")
+        try:
+            flush_offer_index()
+        except Exception as exc:
+            print(f"[INDEX] save failed ({type(exc).__name__}: {exc})")
+        return self.written
+
+print("Function 'build_offer_row' and class 'OfferPipeline' loaded – parse/persist pipeline ready.")
+
 # --- Main per-card worker ---
 def scrape_card(dropdown_label: str, holder: str, seen: Set[Tuple]) -> bool:
     """
-    Enroll all visible offers for a single card (as selected in the dropdown)
-    and capture details into a batch, then append to the sheet once.
+    Enroll all visible offers for a single card (as selected in the dropdown).
+    This thread only drives the browser; parsing and writes happen in OfferPipeline.
     """
     # Ensure the dropdown actually shows this label
-    if get_label_text() != dropdown_label:
-        open_card_dropdown()
-        wait.until(EC.element_to_be_clickable((By.XPATH, f"{OPT_DROPD_X}[normalize-space()='{dropdown_label}']"))).click()
-        WebDriverWait(driver, 10).until(lambda _: get_label_text() == dropdown_label)
-        time.sleep(SWITCH_CARD_SETTLE_PAUSE)  # give the UI a second
+    select_card(dropdown_label)
 
     if not heal_offers_page(dropdown_label):
         sheet_log("WARN", "card", f"{dropdown_label}: could not load offers – aborting this account")
         return False
 
     # Parse card name/last4 from dropdown label; we'll backfill from modal if needed
-    card_from_label, last4_from_label = [s.strip() for s in dropdown_label.rsplit("-", 1)] if "-" in dropdown_label else (dropdown_label, "")
-    card_from_label = card_from_label.replace("Products & Offers", "").strip()
+    card_from_label, last4_from_label = split_card_label(dropdown_label)
 
     # Expand list so all offers are clickable
     try:
-        driver.execute_script("window.scrollTo(0,0);")
-        expand_all()
+        tile_count, to_enroll = expand_all()
     except TimeoutException:
         if not heal_offers_page(dropdown_label):
             sheet_log("WARN", "card", f"{dropdown_label}: offers never loaded – aborting account")
             return False
-        driver.execute_script("window.scrollTo(0,0);")
-        expand_all()
+        tile_count, to_enroll = expand_all()
+    print(f"{dropdown_label}: {tile_count} offer tile(s), {len(to_enroll)} to enroll")
+    if RECORDER:
+        RECORDER.grid(holder, dropdown_label)
 
-    new_rows: List[List[str]] = []
+    pipeline = OfferPipeline(seen, dropdown_label)
     try:
         while (icons := plus_icons()):
             ico = icons[0]
+            # Tile text tells us if this offer was already parsed on another card
+            try:
+                tile = driver.execute_script(TILE_AT_ICON_JS, ico)
+            except Exception:
+                tile = None
+            cache_key = terms_cache_key(tile)
+            cached = TERMS_CACHE.get(cache_key) if cache_key else None
             driver.execute_script("arguments[0].scrollIntoView({block:'center'});", ico)
             driver.execute_script("arguments[0].click();", ico)
 
@@ -888,64 +2386,182 @@ def scrape_card(dropdown_label: str, holder: str, seen: Set[Tuple]) -> bool:
                     sheet_log("WARN", "enroll", "Offer enrollment error – skipping this one")
                     continue
 
-            # Gather data from the modal
-            brand_el = driver.find_elements(By.CSS_SELECTOR, ".mo-modal-img-merchant-name")
-            brand = brand_el[0].text.strip() if brand_el else "Unknown Brand"
-            disc_el = driver.find_elements(By.CSS_SELECTOR, ".mo-modal-offer-title div")
-            disc = disc_el[0].text.strip() if disc_el else ""
-            body_el = driver.find_elements(By.CSS_SELECTOR, "cds-column section")
-            body = body_el[0].text if body_el else ""
-
-            # Max & minimum parse with defaults
-            maxd  = parse_max_disc(body) or ""
-            mins  = parse_min_spend(body) or "None"
-
-            exp_raw_el = driver.find_elements(By.CSS_SELECTOR, ".mo-modal-header-date span")
-            exp_raw = exp_raw_el[0].text.strip() if exp_raw_el else ""
-            exp = normalize_expiration_string(exp_raw)
-
-            local = "Yes" if "philadelphia" in body.lower() else "No"
-            added = datetime.today().strftime("%m/%d/%Y")
-
-            # Backfill card & last4 from modal if dropdown label was missing/lying
-            card_guess, last4_guess = card_name_and_last4_from_modal()
-            card = card_from_label or card_guess or "Citi Card"
-            last4 = last4_from_label or last4_guess or ""
-
-            # Final row
-            row = (holder, last4, card, brand, disc, maxd, mins, added, exp, local)
-            if row not in seen:
-                new_rows.append(list(row))
-                seen.add(row)
+            if RECORDER and tile:
+                RECORDER.modal(holder, dropdown_label, tile.get("id", ""))
+            payload = {"holder": holder, "card": card_from_label, "last4": last4_from_label}
+            if cached:
+                # Enrollment is confirmed above; terms come from the cache
+                payload["terms"] = cached
+            else:
+                # Gather raw data from the modal; parsing happens off-thread
+                brand_el = driver.find_elements(By.CSS_SELECTOR, ".mo-modal-img-merchant-name")
+                disc_el = driver.find_elements(By.CSS_SELECTOR, ".mo-modal-offer-title div")
+                body_el = driver.find_elements(By.CSS_SELECTOR, "cds-column section")
+                exp_raw_el = driver.find_elements(By.CSS_SELECTOR, ".mo-modal-header-date span")
+                payload.update({
+                    "brand": brand_el[0].text.strip() if brand_el else "Unknown Brand",
+                    "disc": disc_el[0].text.strip() if disc_el else "",
+                    "body": body_el[0].text if body_el else "",
+                    "exp_raw": exp_raw_el[0].text.strip() if exp_raw_el else "",
+                    "cache_key": cache_key,
+                })
+            if not (card_from_label and last4_from_label):
+                payload["page_text"] = driver.find_element(By.TAG_NAME, "body").text
+            pipeline.submit(payload)
 
             close_modal()
             time.sleep(0.25)
     except Exception as exc:
         sheet_log("ERROR", "scrape_card", f"{dropdown_label}: {type(exc).__name__}: {exc}")
     finally:
-        # Batch append once per card; then refresh filters to keep them working
-        if new_rows:
-            try:
-                OFFER_WS.append_rows(new_rows, value_input_option="RAW", insert_data_option="INSERT_ROWS")
-                reset_filters_full_range()
-            except Exception as exc:
-                sheet_log("ERROR", "append_rows", f"{type(exc).__name__}: {exc}")
+        # Drain parse workers and write the last chunk (Sheets sink also refreshes filters)
+        written = pipeline.close()
+        save_terms_cache()
+        print(f"{dropdown_label}: {written} new row(s) written")
 
     return True
 
 print("Function 'scrape_card' loaded – per-card enrollment and capture ready.")
 
-def scrape_account(acct: dict) -> None:
-    """Login, reach offers, iterate card labels, then logout."""
+def scan_card(dropdown_label: str, holder: str, snapshot: str) -> bool:
+    """
+    Inventory every offer (enrolled or not) on one card from the tile DOM in a
+    single script call, without opening modals or enrolling anything.
+    """
+    select_card(dropdown_label)
+    if not heal_offers_page(dropdown_label):
+        sheet_log("WARN", "scan", f"{dropdown_label}: could not load offers – aborting this account")
+        return False
+    try:
+        expand_all()
+    except TimeoutException:
+        if not heal_offers_page(dropdown_label):
+            sheet_log("WARN", "scan", f"{dropdown_label}: offers never loaded – aborting account")
+            return False
+        expand_all()
+
+    card, last4 = split_card_label(dropdown_label)
+    tiles = driver.execute_script(SCAN_TILES_JS) or []
+    rows = [[snapshot, holder, last4, card or "Citi Card", t.get("brand") or "Unknown Brand",
+             t.get("discount") or "", normalize_expiration_string(t.get("expiration") or ""),
+             "Yes" if t.get("enrolled") else "No"]
+            for t in tiles if t]
+    try:
+        INVENTORY.write_rows(rows)
+    except Exception as exc:
+        sheet_log("ERROR", "scan", f"{dropdown_label}: {type(exc).__name__}: {exc}")
+    print(f"{dropdown_label}: {len(rows)} offer(s) inventoried")
+    return True
+
+print("Function 'scan_card' loaded – tile-only inventory ready.")
+
+def open_offers_tab() -> str:
+    """Open a new tab in the same session and start loading Offers (non-blocking)."""
+    origin = driver.current_window_handle
+    driver.switch_to.new_window("tab")
+    handle = driver.current_window_handle
+    # window.location returns immediately, unlike driver.get
+    driver.execute_script("window.location.href = arguments[0];", OFFERS_URL)
+    driver.switch_to.window(origin)
+    return handle
+
+print("Function 'open_offers_tab' loaded – background tab opener ready.")
+
+def prime_card_tab(handle: str, label: str, timeout: float = 0) -> bool:
+    """
+    Switch a tab to the given card without waiting for its grid to render.
+    With timeout=0 a tab whose page hasn't loaded yet is left alone (False)
+    so the caller can try again later instead of blocking the browser thread.
+    """
+    origin = driver.current_window_handle
+    try:
+        driver.switch_to.window(handle)
+        if timeout:
+            WebDriverWait(driver, timeout).until(EC.presence_of_element_located((By.XPATH, BTN_DROPD_X)))
+        elif not driver.find_elements(By.XPATH, BTN_DROPD_X):
+            return False
+        click_no_thanks_if_present(0)
+        select_card(label, settle=False)
+    except Exception as exc:
+        # scrape_card re-selects and heals, so a failed prime only costs the overlap
+        sheet_log("WARN", "tabs", f"{label}: prime failed – {type(exc).__name__}: {exc}")
+    finally:
+        driver.switch_to.window(origin)
+    return True
+
+print("Function 'prime_card_tab' loaded – card preloading ready.")
+
+def scrape_cards_multitab(labels: List[str], process: Callable[[str], bool]) -> List[str]:
+    """
+    Process cards across up to CARD_TABS tabs of the logged-in session: while one
+    card is being handled by `process`, the next card's grid is already loading
+    in another tab (primed one card ahead, never blocking on a tab still loading).
+    Returns the labels left unprocessed when `process` had to replace the driver
+    (its tabs are gone), so the caller can finish them in a single tab.
+    """
+    drv = driver
+    main_handle = driver.current_window_handle
+    extra = [open_offers_tab() for _ in range(min(CARD_TABS, len(labels)) - 1)]
+    free = extra + [main_handle]  # loaded tab last: free.pop() takes it, free[0] is the longest idle
+    pending = list(labels)
+    primed: List[Tuple[str, str]] = []
+    try:
+        while True:
+            if not primed and pending:
+                # Nothing preloaded: use the tab we just finished with (already loaded)
+                handle, lbl = free.pop(), pending.pop(0)
+                prime_card_tab(handle, lbl, timeout=20)
+                primed.append((handle, lbl))
+            if not primed:
+                break
+            handle, lbl = primed.pop(0)
+            # One card ahead: start the next grid loading in the longest-idle tab, if it has loaded
+            if pending and free and prime_card_tab(free[0], pending[0]):
+                primed.append((free.pop(0), pending.pop(0)))
+            driver.switch_to.window(handle)
+            ok = process(lbl)
+            if driver is not drv:
+                return pending + [l for _, l in primed]
+            free.append(handle)
+            if not ok:
+                break
+        return []
+    finally:
+        if driver is not drv:
+            extra = []
+        for handle in extra:
+            try:
+                driver.switch_to.window(handle)
+                driver.close()
+            except Exception:
+                pass
+        if driver is drv:
+            driver.switch_to.window(main_handle)
+
+print("Function 'scrape_cards_multitab' loaded – concurrent tab processing ready.")
+
+def scrape_account(acct: dict) -> bool:
+    """Login, reach offers, iterate card labels, then logout (False if never got in)."""
     user, pwd, holder = acct["user"], acct["pass"], acct["holder"]
 
     if not citi_login(user, pwd):
-        return
-    if not goto_offers_page():
+        return False
+    if not goto_offers_page(account=holder):
         citi_logout()
-        return
+        return False
+
+    if HTTP_FAST_PATH and not CLI.scan_only:
+        try:
+            n = http_enroll_account(holder, {tuple(r) for r in OUTPUT.existing_rows()})
+        except Exception as exc:
+            # Any surprise – cookies, transport, API shape – leaves the Selenium flow to do the work
+            reason = exc if isinstance(exc, FastPathUnavailable) else f"{type(exc).__name__}: {exc}"
+            sheet_log("WARN", "http", f"{holder}: fast path unavailable – using browser ({reason})")
+        else:
+            sheet_log("INFO", "http", f"{holder}: {n} offer(s) enrolled via fast path")
+            citi_logout()
+            return True
 
-    seen = {tuple(r) for r in OFFER_WS.get_all_values()[1:]}
     # open dropdown and collect card labels
     try:
         open_card_dropdown()
@@ -956,16 +2572,663 @@ def scrape_account(acct: dict) -> None:
         sheet_log("ERROR", "card_list", f"{type(exc).__name__}: {exc}")
         labels = []
 
+    if CLI.scan_only:
+        snapshot = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        work: Callable[[str], bool] = lambda lbl: scan_card(lbl, holder, snapshot)
+    else:
+        seen = {tuple(r) for r in OUTPUT.existing_rows()}
+        work = lambda lbl: scrape_card(lbl, holder, seen)
+
+    def process(lbl: str) -> bool:
+        """One card under CARD_DEADLINE; on a breach rebuild the browser and move on."""
+        try:
+            with WATCHDOG.phase("card", f"{holder} / {lbl}", CARD_DEADLINE):
+                return work(lbl)
+        except DeadlineExceeded as exc:
+            if exc.kind in ("account", "lease"):
+                raise
+            sheet_log("ERROR", "watchdog", f"{exc} – skipping card, rebuilding browser")
+            restart_driver(reason=str(exc))
+            return citi_login(user, pwd) and goto_offers_page(account=holder)
+
+    if CARD_TABS > 1 and len(labels) > 1:
+        labels = scrape_cards_multitab(labels, process)
     for lbl in labels:
-        ok = scrape_card(lbl, holder, seen)
+        ok = process(lbl)
         if not ok:
             break
 
     citi_logout()
+    return True
 
 print("Function 'scrape_account' loaded – account-level workflow ready.")
 print("Section 'offer scraping' complete – enrollment and capture ready.")
 
+# ---------------------------------------------------------------------------
+# HTTP fast path (browser-less enrollment)
+# ---------------------------------------------------------------------------
+
+class FastPathUnavailable(Exception):
+    """The API answered in a way we don't understand – use the Selenium flow."""
+
+def _pick(d: dict, *names: str, default: Any = "") -> Any:
+    """First present key among `names` (the API's field names vary by version)."""
+    for n in names:
+        if isinstance(d, dict) and d.get(n) not in (None, ""):
+            return d[n]
+    return default
+
+def http_session_from_driver() -> requests.Session:
+    """Pooled keep-alive session carrying the browser's cookies and user agent."""
+    sess = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=HTTP_CONCURRENCY, pool_maxsize=HTTP_CONCURRENCY)
+    sess.mount("https://", adapter)
+    sess.mount("http://", adapter)
+    sess.headers.update({"Accept": "application/json", "Referer": OFFERS_URL})
+    if driver is not None:
+        sess.headers["User-Agent"] = driver.execute_script("return navigator.userAgent;")
+        for c in driver.get_cookies():
+            sess.cookies.set(c["name"], c["value"], domain=c.get("domain"), path=c.get("path", "/"))
+    xsrf = sess.cookies.get("XSRF-TOKEN")
+    if xsrf:
+        sess.headers["X-XSRF-TOKEN"] = xsrf
+    return sess
+
+def http_list_offers(sess: requests.Session, bucket: TokenBucket) -> List[Tuple[dict, dict]]:
+    """[(card, offer), ...] for every card on the account; raises FastPathUnavailable on surprises."""
+    bucket.acquire()
+    try:
+        resp = sess.get(API_BASE + API_OFFERS_PATH, timeout=HTTP_TIMEOUT)
+        data = resp.json() if resp.status_code == 200 else None
+    except (requests.RequestException, ValueError) as exc:
+        raise FastPathUnavailable(f"offer list: {type(exc).__name__}: {exc}")
+    cards = _pick(data or {}, "cards", "accounts", default=None)
+    if not isinstance(cards, list):
+        raise FastPathUnavailable(f"offer list: HTTP {resp.status_code}, unexpected shape")
+    out = []
+    for card in cards:
+        offers = _pick(card, "offers", "merchantOffers", default=[])
+        if not isinstance(offers, list):
+            raise FastPathUnavailable("offer list: card without an offers array")
+        out.extend((card, o) for o in offers if isinstance(o, dict))
+    return out
+
+def http_enroll_one(sess: requests.Session, bucket: TokenBucket, card: dict, offer: dict) -> Tuple[dict, dict]:
+    """POST one enrollment; anything but a clear success raises FastPathUnavailable."""
+    offer_id = _pick(offer, "offerId", "id", "offer_id")
+    if not offer_id:
+        raise FastPathUnavailable("offer without an id")
+    bucket.acquire()
+    try:
+        resp = sess.post(API_BASE + API_ENROLL_PATH.format(offer_id=offer_id),
+                         json={"offerId": offer_id, "cardLastFour": _pick(card, "lastFour", "last4")},
+                         timeout=HTTP_TIMEOUT)
+        body = resp.json() if resp.content else {}
+    except (requests.RequestException, ValueError) as exc:
+        raise FastPathUnavailable(f"enroll {offer_id}: {type(exc).__name__}: {exc}")
+    status = str(_pick(body, "status", default="")).upper()
+    if resp.status_code not in (200, 201) or not (body.get("enrolled") is True or status in ("ENROLLED", "SUCCESS")):
+        raise FastPathUnavailable(f"enroll {offer_id}: HTTP {resp.status_code} {status or body}")
+    return card, offer
+
+def http_enroll_account(holder: str, seen: Set[Tuple]) -> int:
+    """
+    Enroll every unenrolled offer on the account with concurrent API calls
+    (HTTP_CONCURRENCY workers, HTTP_RPM overall). Enrolled offers go through
+    the usual OfferPipeline; returns how many were enrolled.
+
+    On the first failure, enrollments that haven't started are cancelled (the
+    browser fallback picks them up), but every call already in flight is
+    awaited and its success logged before FastPathUnavailable is raised –
+    those offers no longer show an enroll icon for Selenium to find.
+    """
+    sess = http_session_from_driver()
+    bucket = TokenBucket(HTTP_RPM)
+    todo = [(c, o) for c, o in http_list_offers(sess, bucket)
+            if not (o.get("enrolled") is True or str(_pick(o, "status")).upper() == "ENROLLED")]
+    pipeline = OfferPipeline(seen, f"{holder} (http)")
+    enrolled = 0
+    error: Optional[FastPathUnavailable] = None
+    ex = ThreadPoolExecutor(max_workers=HTTP_CONCURRENCY, thread_name_prefix="http-enroll")
+    try:
+        futures = [ex.submit(http_enroll_one, sess, bucket, c, o) for c, o in todo]
+        for fut in as_completed(futures):
+            if fut.cancelled():
+                continue
+            try:
+                card, offer = fut.result()
+            except Exception as exc:
+                if error is None:
+                    error = exc if isinstance(exc, FastPathUnavailable) else \
+                        FastPathUnavailable(f"enroll: {type(exc).__name__}: {exc}")
+                    for pending in futures:
+                        pending.cancel()  # only affects calls that haven't started
+                continue
+            enrolled += 1
+            pipeline.submit({
+                "holder": holder,
+                "card": str(_pick(card, "cardName", "name", "productName")).replace("Products & Offers", "").strip(),
+                "last4": str(_pick(card, "lastFour", "last4")),
+                "brand": _pick(offer, "merchantName", "merchant", "brand", default="Unknown Brand"),
+                "disc": _pick(offer, "title", "offerTitle", "discount"),
+                "body": _pick(offer, "terms", "description", "details"),
+                "exp_raw": _pick(offer, "expirationDate", "expiration", "endDate"),
+            })
+    finally:
+        ex.shutdown(wait=True)
+        pipeline.close()
+        save_terms_cache()
+        sess.close()
+    if error:
+        sheet_log("WARN", "http", f"{holder}: {enrolled} offer(s) enrolled via fast path before the failure")
+        raise error
+    return enrolled
+
+print("Functions 'http_session_from_driver', 'http_list_offers', 'http_enroll_one', 'http_enroll_account' loaded – HTTP fast path ready.")
+
+# --- Local stand-in for the offer API (point CITI_API_BASE at it) ---
+MOCK_SAMPLE_OFFERS = {"cards": [
+    {"cardName": "Citi Test Card", "lastFour": "0000", "offers": [
+        {"offerId": "m1", "merchantName": "Sample Coffee", "title": "10% back",
+         "terms": "Spend $10 or more, get 10% back. Maximum $5.", "expirationDate": "12/31/2099", "enrolled": False},
+        {"offerId": "m2", "merchantName": "Sample Books", "title": "$15 back",
+         "terms": "Spend $75 or more, get $15 back.", "expirationDate": "12/31/2099", "enrolled": False},
+        {"offerId": "m3", "merchantName": "Sample Shoes", "title": "5% back",
+         "terms": "Earn 5% back up to $20.", "expirationDate": "12/31/2099", "enrolled": True},
+    ]},
+]}
+
+class MockOfferApiHandler(BaseHTTPRequestHandler):
+    """Serves API_OFFERS_PATH / API_ENROLL_PATH from an in-memory offer list."""
+    state: dict = {}
+    latency = float(os.getenv("CITI_MOCK_LATENCY_MS", "0")) / 1000.0
+    lock = threading.Lock()
+    enroll_re = re.compile("^" + re.escape(API_ENROLL_PATH).replace(re.escape("{offer_id}"), "([^/?]+)") + "$")
+
+    def _send(self, code: int, payload: dict) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        time.sleep(self.latency)
+        if self.path.split("?")[0] != API_OFFERS_PATH:
+            return self._send(404, {"error": "not found"})
+        with self.lock:
+            self._send(200, self.state)
+
+    def do_POST(self) -> None:
+        time.sleep(self.latency)
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        m = self.enroll_re.match(self.path.split("?")[0])
+        with self.lock:
+            offer = next((o for c in self.state.get("cards", []) for o in c.get("offers", [])
+                          if m and o.get("offerId") == m.group(1)), None)
+            if not offer:
+                return self._send(404, {"error": "unknown offer"})
+            offer["enrolled"] = True
+            self._send(200, {"enrolled": True, "status": "ENROLLED"})
+
+    def log_message(self, fmt: str, *args) -> None:
+        pass
+
+def serve_mock_api(port: int) -> None:
+    """Run the mock API until interrupted (offers from CITI_MOCK_OFFERS_FILE or a built-in sample)."""
+    src = os.getenv("CITI_MOCK_OFFERS_FILE", "")
+    if src:
+        with open(src, encoding="utf-8") as fh:
+            MockOfferApiHandler.state = json.load(fh)
+    else:
+        MockOfferApiHandler.state = json.loads(json.dumps(MOCK_SAMPLE_OFFERS))
+    server = ThreadingHTTPServer(("127.0.0.1", port), MockOfferApiHandler)
+    print(f"Mock offer API on http://127.0.0.1:{port} – set CITI_API_BASE to use it.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+print("Class 'MockOfferApiHandler' and function 'serve_mock_api' loaded – local API stand-in ready.")
+print("Section 'HTTP fast path' complete – browser-less enrollment ready.")
+
+# ---------------------------------------------------------------------------
+# Record & replay
+# ---------------------------------------------------------------------------
+
+# Allowlisted page snapshot: only what the scraper and replay shim read – the
+# card dropdown (button + label), the Enrolled/All tabs and the smallest
+# subtree holding every offer tile. Headers, account panels and footers never
+# leave the browser.
+SNAPSHOT_JS = """
+var keep = [];
+function add(el) {
+  if (!el || keep.some(function (k) { return k.contains(el); })) return;
+  keep = keep.filter(function (k) { return !el.contains(k); });
+  keep.push(el);
+}
+add(document.getElementById('cds-dropdown'));
+add(document.getElementById('cds-dropdown-button-value'));
+Array.prototype.forEach.call(document.querySelectorAll('a'), function (a) {
+  var t = (a.textContent || '').trim();
+  if (t === 'Enrolled' || t === 'All') add(a);
+});
+var tiles = Array.prototype.filter.call(document.querySelectorAll("div[class*='offer-tile']"), function (t) {
+  return !(t.parentElement && t.parentElement.closest("div[class*='offer-tile']"));
+});
+if (tiles.length) {
+  var grid = tiles.length > 1 ? tiles[0].parentElement : tiles[0];
+  while (grid && !tiles.every(function (t) { return grid.contains(t); })) grid = grid.parentElement;
+  add(grid);
+}
+if (!keep.length) return null;
+keep.sort(function (x, y) { return x.compareDocumentPosition(y) & Node.DOCUMENT_POSITION_FOLLOWING ? -1 : 1; });
+return '<!DOCTYPE html><html><head></head><body>' +
+       keep.map(function (el) { return el.outerHTML; }).join('\\n') + '</body></html>';
+"""
+# Outermost modal/dialog container around the merchant name scrape_card reads
+MODAL_SNAPSHOT_JS = """
+var el = document.querySelector('.mo-modal-img-merchant-name');
+if (!el) return null;
+var box = el.closest("[role='dialog']") || el.closest('cds-modal') || el.closest("[class*='modal']") || el.parentElement;
+while (box.parentElement && box.parentElement !== document.body &&
+       /modal|dialog|overlay/i.test(box.parentElement.getAttribute('class') || '')) {
+  box = box.parentElement;
+}
+return box.outerHTML;
+"""
+# Scripts, frames and external resources never go into a bundle: they carry
+# session tokens and would make replays reach out to the network.
+FIXTURE_STRIP_RES = [
+    re.compile(r"<script\b.*?</script\s*>", re.S | re.I),
+    re.compile(r"<noscript\b.*?</noscript\s*>", re.S | re.I),
+    re.compile(r"<iframe\b.*?</iframe\s*>", re.S | re.I),
+    re.compile(r"<(?:link|base|meta)\b[^>]*>", re.I),
+    re.compile(r"\s(?:src|srcset|href|action|value|on[a-z]+)=\"[^\"]*\"", re.I),
+]
+EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+LONG_DIGITS_RE = re.compile(r"(?<!\d)\d{8,}(?!\d)")  # account/reference numbers
+
+class FixtureRecorder:
+    """
+    Captures what goto_offers_page and scrape_card saw – the offers landing
+    page, each card's expanded grid and every offer modal – and writes them as
+    a fixture bundle (manifest.json + HTML) that --replay serves offline.
+    Only allowlisted subtrees are captured (SNAPSHOT_JS, MODAL_SNAPSHOT_JS).
+    Snapshots stay raw in memory; holder names, usernames, card last-fours,
+    emails and long numbers are scrubbed when the bundle is written.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.accounts: List[dict] = []
+
+    def _snap(self, js: str) -> Optional[str]:
+        try:
+            return driver.execute_script(js)
+        except Exception as exc:
+            print(f"[RECORD] snapshot skipped ({type(exc).__name__}: {exc})")
+            return None
+
+    def _account(self, holder: str) -> dict:
+        if not self.accounts or self.accounts[-1]["holder"] != holder:
+            self.accounts.append({"holder": holder, "landing": "", "cards": []})
+        return self.accounts[-1]
+
+    def landing(self, holder: str) -> None:
+        self._account(holder)["landing"] = self._snap(SNAPSHOT_JS) or ""
+
+    def grid(self, holder: str, label: str) -> None:
+        html = self._snap(SNAPSHOT_JS)
+        if html:
+            self._account(holder)["cards"].append({"label": label, "grid": html, "modals": {}})
+
+    def modal(self, holder: str, label: str, tile_id: str) -> None:
+        cards = self._account(holder)["cards"]
+        if tile_id and cards and cards[-1]["label"] == label and tile_id not in cards[-1]["modals"]:
+            html = self._snap(MODAL_SNAPSHOT_JS)
+            if html:
+                cards[-1]["modals"][tile_id] = html
+
+    def _scrubber(self) -> Callable[[str], str]:
+        subs: List[Tuple[re.Pattern, str]] = [(EMAIL_RE, "user@example.com")]  # before names inside addresses
+        for i, a in enumerate(ACCOUNTS, start=1):
+            for real, fake in ((a["user"], f"user{i}"), (a["holder"], f"Holder {i}")):
+                if real:
+                    subs.append((re.compile(re.escape(real), re.I), fake))
+        subs += [(re.compile(re.escape(t), re.I), "REDACTED") for t in SCRUB_TERMS]
+        last4s = sorted({split_card_label(c["label"])[1] for a in self.accounts for c in a["cards"]} - {""})
+        subs += [(re.compile(rf"(?<!\d){re.escape(l4)}(?!\d)"), f"{9000 + n:04d}") for n, l4 in enumerate(last4s)]
+
+        def scrub(text: str) -> str:
+            for rx in FIXTURE_STRIP_RES:
+                text = rx.sub("", text)
+            for rx, fake in subs:
+                text = rx.sub(fake, text)
+            return LONG_DIGITS_RE.sub(lambda m: "0" * len(m.group(0)), text)
+        return scrub
+
+    def write(self) -> None:
+        """(Re)write the whole bundle; called after every account so partial runs are usable."""
+        scrub = self._scrubber()
+        self.root.mkdir(parents=True, exist_ok=True)
+
+        def put(name: str, html: str) -> str:
+            (self.root / name).write_text(scrub(html), encoding="utf-8")
+            return name
+
+        holders = {a["holder"]: f"Holder {i}" for i, a in enumerate(ACCOUNTS, start=1)}
+        manifest: Dict[str, Any] = {"version": 1, "recorded_at": datetime.now().isoformat(timespec="seconds"),
+                                    "accounts": []}
+        for ai, acct in enumerate(self.accounts, start=1):
+            if not acct["cards"]:
+                continue
+            entry = {"holder": holders.get(acct["holder"], f"Holder {ai}"),
+                     "landing": put(f"a{ai}-landing.html", acct["landing"] or acct["cards"][0]["grid"]),
+                     "cards": []}
+            for ci, card in enumerate(acct["cards"], start=1):
+                entry["cards"].append({
+                    "label": scrub(card["label"]),
+                    "grid": put(f"a{ai}-c{ci}-grid.html", card["grid"]),
+                    "modals": {scrub(tid): put(f"a{ai}-c{ci}-m{mi}.html", html)
+                               for mi, (tid, html) in enumerate(card["modals"].items(), start=1)},
+                })
+            manifest["accounts"].append(entry)
+        with open(self.root / "manifest.json", "w", encoding="utf-8") as fh:
+            json.dump(manifest, fh, indent=2)
+        print(f"Fixture bundle written to {self.root} – {len(manifest['accounts'])} account(s).")
+
+RECORDER = FixtureRecorder(RECORD_DIR) if RECORD_DIR else None
+print("Class 'FixtureRecorder' loaded – session recording " + ("on." if RECORDER else "off."))
+
+# Injected into every replayed page: stands in for the Angular app by driving
+# the card dropdown, enroll icons and offer modal from the bundle. Requests are
+# synchronous so each WebDriver command sees the same DOM on every replay.
+REPLAY_SHIM_JS = TILE_ID_JS + """
+(function () {
+  var R = window.REPLAY, base = '/acct/' + R.acct;
+  function get(url) {
+    var x = new XMLHttpRequest(); x.open('GET', url, false); x.send();
+    return x.status === 200 ? x.responseText : null;
+  }
+  function currentCard() {
+    var el = document.getElementById('cds-dropdown-button-value');
+    return R.cards.indexOf(el ? el.textContent.trim() : '');
+  }
+  function storeKey() { return 'replay-enrolled-' + R.acct + '-' + currentCard(); }
+  function listbox() { return document.getElementById('cds-dropdown-listbox'); }
+  function markEnrolled(tile) {
+    var ico = tile.querySelector("cds-icon[name='plus-circle'][arialabel='Enroll']");
+    if (ico) { ico.setAttribute('name', 'check-circle'); ico.removeAttribute('arialabel'); }
+    if (!tile.querySelector('.enrolled')) {
+      var d = document.createElement('div'); d.className = 'enrolled'; tile.appendChild(d);
+    }
+  }
+  function settle() {
+    if (listbox()) listbox().remove();
+    Array.prototype.forEach.call(document.querySelectorAll('button'), function (b) {
+      var t = (b.textContent || '').toLowerCase();
+      if (t.indexOf('show more') >= 0 || t.indexOf('load more') >= 0) b.style.display = 'none';
+    });
+    var done = JSON.parse(sessionStorage.getItem(storeKey()) || '[]');
+    Array.prototype.forEach.call(document.querySelectorAll("div[class*='offer-tile']"), function (t) {
+      if (done.indexOf(tileId(t)) >= 0) markEnrolled(t);
+    });
+  }
+  function showCard(i) {
+    var html = get(base + '/grid/' + i);
+    if (html === null) return;
+    document.body.innerHTML = new DOMParser().parseFromString(html, 'text/html').body.innerHTML;
+    settle();
+  }
+  function closeModals() {
+    Array.prototype.forEach.call(document.querySelectorAll('[data-replay-modal]'), function (m) { m.remove(); });
+  }
+  document.addEventListener('click', function (e) {
+    var t = e.target;
+    if (!t.closest) return;
+    var opt = t.closest('#cds-dropdown-listbox li');
+    if (opt) {
+      e.preventDefault();
+      listbox().remove();
+      var i = R.cards.indexOf(opt.textContent.trim());
+      if (i >= 0) showCard(i);
+      return;
+    }
+    var btn = t.closest('#cds-dropdown');
+    if (btn) {
+      e.preventDefault();
+      if (listbox()) { listbox().remove(); return; }
+      var ul = document.createElement('ul'); ul.id = 'cds-dropdown-listbox'; ul.setAttribute('role', 'listbox');
+      R.cards.forEach(function (label) {
+        var li = document.createElement('li'); li.setAttribute('role', 'option'); li.textContent = label; ul.appendChild(li);
+      });
+      btn.insertAdjacentElement('afterend', ul);
+      return;
+    }
+    var ico = t.closest("cds-icon[name='plus-circle'][arialabel='Enroll']");
+    if (ico) {
+      var tile = ico.closest("div[class*='offer-tile']");
+      if (!tile) return;
+      var id = tileId(tile), key = storeKey(), done = JSON.parse(sessionStorage.getItem(key) || '[]');
+      done.push(id); sessionStorage.setItem(key, JSON.stringify(done));
+      markEnrolled(tile);
+      var html = id ? get(base + '/modal/' + currentCard() + '/' + encodeURIComponent(id)) : null;
+      if (html !== null) {
+        var m = document.createElement('div'); m.setAttribute('data-replay-modal', ''); m.innerHTML = html;
+        document.body.appendChild(m);
+      }
+      return;
+    }
+    if (t.closest('[data-replay-modal] button')) { e.preventDefault(); closeModals(); return; }
+    if (t.closest('a')) e.preventDefault();  // recorded links would leave the fixture
+  }, true);
+  document.addEventListener('keydown', function (e) {
+    if (e.key === 'Escape') { closeModals(); if (listbox()) listbox().remove(); }
+  }, true);
+  settle();
+})();
+"""
+
+NOT_FOUND_HTML = "<html><body><h1>Page not found</h1></body></html>"
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    """Serves a fixture bundle under /acct/<n>/...: landing page, card grids, modals and the shim."""
+    bundle: Path = Path(".")
+    manifest: dict = {}
+
+    def _send(self, code: int, body: str, ctype: str = "text/html; charset=utf-8") -> None:
+        data = body.encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _page(self, acct_no: int, name: str) -> str:
+        html = (self.bundle / name).read_text(encoding="utf-8")
+        labels = [c["label"] for c in self.manifest["accounts"][acct_no]["cards"]]
+        inject = (f"<script>window.REPLAY = {json.dumps({'acct': acct_no, 'cards': labels})};</script>"
+                  f"<script src=\"/replay-shim.js\"></script>")
+        return html.replace("</body>", inject + "</body>") if "</body>" in html else html + inject
+
+    def do_GET(self) -> None:
+        path = requests.utils.unquote(self.path.split("?")[0])
+        if path == "/replay-shim.js":
+            return self._send(200, REPLAY_SHIM_JS, "application/javascript")
+        m = re.match(r"^/acct/(\d+)/(.*)$", path)
+        accounts = self.manifest.get("accounts", [])
+        if not m or int(m.group(1)) >= len(accounts):
+            return self._send(404, NOT_FOUND_HTML)
+        n, rest = int(m.group(1)), m.group(2)
+        cards = accounts[n]["cards"]
+        if rest.rstrip("/").endswith("merchantoffers"):
+            return self._send(200, self._page(n, accounts[n]["landing"]))
+        g = re.match(r"^grid/(\d+)$", rest)
+        if g and int(g.group(1)) < len(cards):
+            return self._send(200, (self.bundle / cards[int(g.group(1))]["grid"]).read_text(encoding="utf-8"))
+        md = re.match(r"^modal/(\d+)/(.+)$", rest)
+        if md and int(md.group(1)) < len(cards):
+            name = cards[int(md.group(1))]["modals"].get(md.group(2))
+            if name:
+                return self._send(200, (self.bundle / name).read_text(encoding="utf-8"))
+        return self._send(404, NOT_FOUND_HTML)
+
+    def log_message(self, fmt: str, *args) -> None:
+        pass
+
+def compare_replays(previous: dict, current: dict) -> None:
+    """Print wall time, WebDriver command and row deltas against the previous replay report."""
+    before, after = previous.get("replay", {}), current["replay"]
+    print(f"vs {previous.get('started', '?')}: wall {before.get('wall_secs', 0):.1f}s -> {after['wall_secs']:.1f}s, "
+          f"commands {before.get('commands', 0)} -> {after['commands']}, "
+          f"rows {before.get('rows_written', 0)} -> {after['rows_written']}")
+    old_cmds = previous.get("commands", {})
+    for name in sorted(set(old_cmds) | set(current["commands"])):
+        a = old_cmds.get(name, {}).get("count", 0)
+        b = current["commands"].get(name, {}).get("count", 0)
+        if a != b:
+            print(f"  {name:<28}{a:>6} -> {b:<6}({b - a:+d})")
+
+def run_replay(bundle: Path) -> None:
+    """Serve a fixture bundle locally and run every recorded account against it."""
+    global OFFERS_URL
+    with open(bundle / "manifest.json", encoding="utf-8") as fh:
+        manifest = json.load(fh)
+    ReplayHandler.bundle, ReplayHandler.manifest = bundle, manifest
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ReplayHandler)
+    threading.Thread(target=server.serve_forever, name="replay-server", daemon=True).start()
+    port = server.server_address[1]
+    previous = sorted((bundle / "replays").glob("run-*.json"))
+    print(f"Replaying {bundle} on port {port} – {len(manifest['accounts'])} account(s).")
+
+    COMMAND_STATS.clear()
+    t0 = time.perf_counter()
+    ok = 0
+    try:
+        for i, acct in enumerate(manifest["accounts"]):
+            OFFERS_URL = f"http://127.0.0.1:{port}/acct/{i}/US/ag/products-offers/merchantoffers"
+            ok += run_one_account({"user": f"replay-{i}", "pass": "", "holder": acct["holder"]})
+    finally:
+        server.shutdown()
+        server.server_close()
+    SHEETS.flush()
+    RUN_REPORT["replay"] = {
+        "bundle": str(bundle),
+        "accounts": len(manifest["accounts"]),
+        "accounts_ok": ok,
+        "wall_secs": round(time.perf_counter() - t0, 2),
+        "commands": int(sum(n for n, _ in COMMAND_STATS.values())),
+        "rows_written": max(0, len(SHEETS.get_all_values(OFFER_WS)) - 1),
+    }
+    current = {**RUN_REPORT, "commands": {k: {"count": int(n)} for k, (n, _) in COMMAND_STATS.items()}}
+    summary = RUN_REPORT["replay"]
+    print(f"Replay done – {summary['accounts_ok']}/{summary['accounts']} account(s), {summary['wall_secs']:.1f}s, "
+          f"{summary['commands']} WebDriver command(s), {summary['rows_written']} row(s).")
+    if previous:
+        try:
+            with open(previous[-1], encoding="utf-8") as fh:
+                compare_replays(json.load(fh), current)
+        except Exception as exc:
+            print(f"Previous replay unreadable ({type(exc).__name__}: {exc}) – no comparison.")
+
+print("Class 'ReplayHandler' and functions 'run_replay', 'compare_replays' loaded – offline replay ready.")
+print("Section 'record & replay' complete – fixture bundles ready.")
+
+# ---------------------------------------------------------------------------
+# Offer history archive
+# ---------------------------------------------------------------------------
+
+# Append-only columnar layout, one immutable segment per write:
+#   ARCHIVE_DIR/month=YYYY-MM/part-<ns>-<pid>/<column>.json.gz  (+ _meta.json)
+# Scans open only the month directories and column files they ask for.
+
+def _archive_col_file(header: str) -> str:
+    return re.sub(r"\W+", "_", header.lower()).strip("_") + ".json.gz"
+
+def archive_append(rows: List[List[str]]) -> int:
+    """
+    Write offer rows into month partitions (by expiration month). Each segment
+    is built in a temp dir and renamed into place, so readers never see half a
+    segment. Rows already in their month's partition are skipped, so archiving
+    again after a failed sheet delete doesn't double-count. Returns the number
+    of rows newly archived.
+    """
+    by_month: Dict[str, Dict[Tuple[str, ...], None]] = {}
+    for r in rows:
+        d = try_parse_date_any(r[8]) if len(r) > 8 else None
+        key = tuple(r[ci] if ci < len(r) else "" for ci in range(len(OFFER_HEADERS)))
+        by_month.setdefault(d.strftime("%Y-%m") if d else "unknown", {})[key] = None
+    stamp = f"{time.time_ns()}-{os.getpid()}"
+    added = 0
+    for month, keys in by_month.items():
+        archived = {tuple(a[h] for h in OFFER_HEADERS) for a in archive_scan(month_from=month, month_to=month)}
+        chunk = [k for k in keys if k not in archived]
+        if not chunk:
+            continue
+        added += len(chunk)
+        part_dir = ARCHIVE_DIR / f"month={month}"
+        part_dir.mkdir(parents=True, exist_ok=True)
+        tmp = part_dir / f".tmp-part-{stamp}"
+        tmp.mkdir()
+        for ci, header in enumerate(OFFER_HEADERS):
+            with gzip.open(tmp / _archive_col_file(header), "wt", encoding="utf-8") as fh:
+                json.dump([r[ci] if ci < len(r) else "" for r in chunk], fh)
+        with open(tmp / "_meta.json", "w", encoding="utf-8") as fh:
+            json.dump({"rows": len(chunk), "columns": list(OFFER_HEADERS),
+                       "archived_at": datetime.now().isoformat(timespec="seconds")}, fh)
+        os.replace(tmp, part_dir / f"part-{stamp}")
+    return added
+
+def archive_scan(columns: Optional[List[str]] = None, month_from: str = "",
+                 month_to: str = "") -> Iterator[Dict[str, str]]:
+    """
+    Yield archived rows as {header: value}, reading only `columns` (default:
+    all) from partitions whose month is within [month_from, month_to] (YYYY-MM).
+    """
+    cols = list(columns or OFFER_HEADERS)
+    if not ARCHIVE_DIR.exists():
+        return
+    for part_dir in sorted(ARCHIVE_DIR.glob("month=*")):
+        month = part_dir.name.split("=", 1)[1]
+        if (month_from and month < month_from) or (month_to and month > month_to):
+            continue
+        for seg in sorted(part_dir.glob("part-*")):
+            data = {}
+            for c in cols:
+                with gzip.open(seg / _archive_col_file(c), "rt", encoding="utf-8") as fh:
+                    data[c] = json.load(fh)
+            for i in range(len(data[cols[0]])):
+                yield {c: data[c][i] for c in cols}
+
+def archive_offers_by_month(merchant: str) -> Dict[str, int]:
+    """Archived offer count per expiration month for brands matching `merchant`."""
+    q = normalize_brand(merchant)
+    counts: Dict[str, int] = {}
+    for r in archive_scan(["Brand", "Expiration"]):
+        if q and q in normalize_brand(r["Brand"]):
+            d = try_parse_date_any(r["Expiration"])
+            key = d.strftime("%Y-%m") if d else "unknown"
+            counts[key] = counts.get(key, 0) + 1
+    return dict(sorted(counts.items()))
+
+def run_history(merchant: str) -> None:
+    """Print the answer for --history."""
+    counts = archive_offers_by_month(merchant)
+    if not counts:
+        print(f"No archived offers for '{merchant}'.")
+        return
+    print(f"Archived offers for '{merchant}' by expiration month:")
+    for month, n in counts.items():
+        print(f"  {month}  {n}")
+
+print("Functions 'archive_append', 'archive_scan', 'archive_offers_by_month', 'run_history' loaded – offer history archive ready.")
+print("Section 'offer history archive' complete – expired offers preserved.")
+
 # ---------------------------------------------------------------------------
 # Sheet maintenance
 # ---------------------------------------------------------------------------
@@ -986,21 +3249,30 @@ def row_is_expired(row: List[str]) -> bool:
 print("Function 'row_is_expired' loaded – expiration detector ready.")
 
 def delete_expired_rows() -> None:
-    rows = OFFER_WS.get_all_values()
+    """Archive expired offers, then delete them from the sheet."""
+    rows = SHEETS.get_all_values(OFFER_WS)
     sid  = OFFER_WS.id
     req  = []
+    expired: Dict[Tuple, None] = {}  # ordered set; duplicates are archived once
     for i in range(len(rows) - 1, 0, -1):
         if row_is_expired(rows[i]):
+            expired[tuple(rows[i])] = None
             req.append({"deleteRange": {"range": {"sheetId": sid, "startRowIndex": i, "endRowIndex": i + 1},
                                         "shiftDimension": "ROWS"}})
     if req:
-        OFFER_WS.spreadsheet.batch_update({"requests": req})
-        sheet_log("INFO", "cleanup", f"deleted {len(req)} expired row(s)")
+        try:
+            archived = archive_append([list(r) for r in reversed(expired)])
+        except Exception as exc:
+            # Keep the rows in the sheet rather than lose history
+            sheet_log("ERROR", "cleanup", f"archive failed, expired rows kept: {type(exc).__name__}: {exc}")
+            return
+        SHEETS.batch_update(req)
+        sheet_log("INFO", "cleanup", f"deleted {len(req)} expired row(s), {archived} newly archived")
 
 print("Function 'delete_expired_rows' loaded – expiration cleanup ready.")
 
 def dedupe_rows() -> None:
-    rows = OFFER_WS.get_all_values()
+    rows = SHEETS.get_all_values(OFFER_WS)
     seen = set()
     sid  = OFFER_WS.id
     req  = []
@@ -1012,18 +3284,18 @@ def dedupe_rows() -> None:
         else:
             seen.add(key)
     if req:
-        OFFER_WS.spreadsheet.batch_update({"requests": req})
+        SHEETS.queue_requests(req)
         sheet_log("INFO", "dedupe", f"removed {len(req)} duplicate row(s)")
 
 print("Function 'dedupe_rows' loaded – duplicate removal ready.")
 
 def reset_filters_full_range() -> None:
     """Re-apply filters to the full used range so dropdowns include new values."""
-    values = OFFER_WS.get_all_values()
+    values = SHEETS.get_all_values(OFFER_WS)
     last_row = max(1, len(values))
     last_col = len(OFFER_HEADERS)
     sid = OFFER_WS.id
-    SHEET.batch_update({"requests": [
+    SHEETS.queue_requests([
         {"clearBasicFilter": {"sheetId": sid}},
         {"setBasicFilter": {"filter": {
             "range": {
@@ -1033,18 +3305,452 @@ def reset_filters_full_range() -> None:
                 "startColumnIndex": 0,
                 "endColumnIndex": last_col
             }
-        }}}]})
+        }}}])
     sheet_log("INFO", "filters", f"basic filter reset for rows 1..{last_row}")
 
 print("Function 'reset_filters_full_range' loaded – filter reset ready.")
 print("Section 'sheet maintenance' complete – cleanup utilities ready.")
 
+# ---------------------------------------------------------------------------
+# Merchant lookup index
+# ---------------------------------------------------------------------------
+
+# {normalized brand: [offer row, ...]}; loaded lazily, saved after each update
+OFFER_INDEX: Optional[Dict[str, List[List[str]]]] = None
+INDEX_KEYS: List[str] = []  # sorted brands for prefix lookups
+INDEX_LOCK = threading.Lock()
+INDEX_SEEN: Dict[str, Set[Tuple[str, ...]]] = {}  # per-brand row sets, built on first add
+INDEX_DIRTY = False  # in-memory adds not yet written to INDEX_PATH
+
+def normalize_brand(name: str) -> str:
+    """'Café Nero, Inc.' -> 'cafe nero inc' (accents, punctuation and case folded)."""
+    s = unicodedata.normalize("NFKD", name or "").encode("ascii", "ignore").decode()
+    s = re.sub(r"[^a-z0-9]+", " ", s.lower()).strip()
+    return re.sub(r"^the ", "", s)
+
+MONEY_RE = re.compile(r"\$\s*(\d[\d,]*(?:\.\d+)?)")
+# "$20 back", "$20 cash back", "$20 off", "$20 statement credit"
+REWARD_AMOUNT_RE = re.compile(r"\$\s*(\d[\d,]*(?:\.\d+)?)\s*(?:cash\s+)?(?:back|off|(?:statement\s+)?credit)", re.I)
+# "spend $100", "when you spend $100 or more"
+SPEND_AMOUNT_RE = re.compile(r"spend(?:ing)?\s+(?:of\s+)?\$\s*(\d[\d,]*(?:\.\d+)?)", re.I)
+
+def _amount(text: str) -> float:
+    return float(text.replace(",", "").rstrip("."))
+
+def _money(text: str) -> Optional[float]:
+    m = MONEY_RE.search(text or "")
+    return _amount(m.group(1)) if m else None
+
+def offer_value(row: List[str], spend: float) -> float:
+    """
+    Dollar value of an offer row for a purchase of `spend`: percentage offers
+    are capped by 'Maximum Discount'; nothing counts below 'Minimum Spend' or
+    a "spend $X" threshold in the offer text. A flat offer is worth the amount
+    next to back/off/credit, else the smallest amount that isn't the threshold.
+    """
+    disc, maxd, mins = row[4] or "", row[5], row[6]
+    threshold = SPEND_AMOUNT_RE.search(disc)
+    if spend < max(_money(mins) or 0.0, _amount(threshold.group(1)) if threshold else 0.0):
+        return 0.0
+    pct = re.search(r"(\d+(?:\.\d+)?)\s*%", disc)
+    if pct:
+        value = spend * float(pct.group(1)) / 100.0
+        cap = _money(maxd)
+        return min(value, cap) if cap is not None else value
+    reward = REWARD_AMOUNT_RE.search(disc)
+    if reward:
+        return _amount(reward.group(1))
+    amounts = [m for m in MONEY_RE.finditer(disc) if not (threshold and m.start(1) == threshold.start(1))]
+    return min(_amount(m.group(1)) for m in amounts) if amounts else 0.0
+
+print("Functions 'normalize_brand', 'offer_value' loaded – offer valuation ready.")
+
+def save_offer_index() -> None:
+    """Write the index atomically (caller holds INDEX_LOCK)."""
+    tmp = INDEX_PATH.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump({"version": 1, "brands": OFFER_INDEX}, fh)
+    os.replace(tmp, INDEX_PATH)
+
+def load_offer_index() -> Dict[str, List[List[str]]]:
+    """Load the index from INDEX_PATH, building it once from the output sink if missing."""
+    global OFFER_INDEX, INDEX_KEYS
+    with INDEX_LOCK:
+        if OFFER_INDEX is not None:
+            return OFFER_INDEX
+        try:
+            with open(INDEX_PATH, encoding="utf-8") as fh:
+                brands = json.load(fh)["brands"]
+            # Expired offers never answer a query; drop them as we load
+            OFFER_INDEX = {k: live for k, rows in brands.items()
+                           if (live := [r for r in rows if not row_is_expired(r)])}
+        except Exception:
+            OFFER_INDEX = {}
+            for r in OUTPUT.existing_rows():
+                if len(r) >= len(OFFER_HEADERS):
+                    OFFER_INDEX.setdefault(normalize_brand(r[3]), []).append(list(r))
+            save_offer_index()
+            print(f"Offer index built – {len(OFFER_INDEX)} merchant(s).")
+        INDEX_KEYS = sorted(OFFER_INDEX)
+        return OFFER_INDEX
+
+def index_add_rows(rows: List[List[str]]) -> None:
+    """
+    Fold newly written offer rows into the in-memory index (called by
+    OfferPipeline per chunk); flush_offer_index() persists them.
+    """
+    global INDEX_DIRTY
+    load_offer_index()
+    with INDEX_LOCK:
+        for r in rows:
+            brand = normalize_brand(r[3])
+            if brand not in OFFER_INDEX:
+                OFFER_INDEX[brand] = []
+                bisect.insort(INDEX_KEYS, brand)
+            seen = INDEX_SEEN.get(brand)
+            if seen is None:
+                seen = INDEX_SEEN[brand] = {tuple(b) for b in OFFER_INDEX[brand]}
+            if tuple(r) not in seen:
+                seen.add(tuple(r))
+                OFFER_INDEX[brand].append(list(r))
+                INDEX_DIRTY = True
+
+def flush_offer_index() -> None:
+    """Write pending index adds to disk (once per card, and at exit)."""
+    global INDEX_DIRTY
+    with INDEX_LOCK:
+        if INDEX_DIRTY and OFFER_INDEX is not None:
+            save_offer_index()
+            INDEX_DIRTY = False
+
+def query_offers(term: str, spend: float, limit: int = 10) -> List[Tuple[float, List[str]]]:
+    """
+    Active offers for a merchant, best value first. Matches the exact brand,
+    then brands starting with the term, then close fuzzy matches.
+    """
+    index = load_offer_index()
+    q = normalize_brand(term)
+    if not q:
+        return []
+    lo = bisect.bisect_left(INDEX_KEYS, q)
+    keys = []
+    for k in INDEX_KEYS[lo:]:
+        if not k.startswith(q):
+            break
+        keys.append(k)
+    if not keys:
+        keys = difflib.get_close_matches(q, INDEX_KEYS, n=5, cutoff=0.75)
+    hits = [(offer_value(r, spend), r) for k in keys for r in index.get(k, []) if not row_is_expired(r)]
+    hits.sort(key=lambda h: (-h[0], try_parse_date_any(h[1][8]) or date.max))
+    return hits[:limit]
+
+def run_query(term: str, spend: float) -> None:
+    """Print the ranked answer for --query."""
+    t0 = time.perf_counter()
+    hits = query_offers(term, spend)
+    ms = (time.perf_counter() - t0) * 1000
+    if not hits:
+        print(f"No active offers found for '{term}' ({ms:.1f} ms).")
+        return
+    print(f"Best offers for '{term}' on a ${spend:,.2f} purchase ({ms:.1f} ms):")
+    for value, r in hits:
+        print(f"  ${value:>8,.2f}  {r[0]} · {r[2]} {r[1]} · {r[3]}: {r[4]}"
+              f" (max {r[5] or '-'}, min {r[6]}, expires {r[8]})")
+
+print("Functions 'load_offer_index', 'index_add_rows', 'flush_offer_index', 'query_offers', 'run_query' loaded – merchant lookup ready.")
+print("Section 'merchant lookup index' complete – --query ready.")
+
+# ---------------------------------------------------------------------------
+# Account work queue (multi-machine runs)
+# ---------------------------------------------------------------------------
+
+CLEANUP_JOB = "__cleanup__"  # sheet maintenance; claimable once QUEUE_HOSTS joined and every account job finished
+
+class WorkQueue(abc.ABC):
+    """
+    Leased jobs for one run id: claim -> heartbeat -> complete / fail.
+    Failed jobs come back after an exponential delay until QUEUE_MAX_ATTEMPTS;
+    a lease that is not renewed in time (crashed worker) is reclaimed, unless
+    it already used its last attempt – then claim marks it failed instead.
+    Hosts join() after enqueuing their accounts; CLEANUP_JOB stays unclaimable
+    until QUEUE_HOSTS distinct hosts have joined the run.
+    """
+
+    @abc.abstractmethod
+    def join(self, run_id: str, host: str) -> None:
+        """Record that `host` has enqueued all of its jobs for this run."""
+
+    @abc.abstractmethod
+    def hosts(self, run_id: str) -> int:
+        """Distinct hosts that have joined the run."""
+
+    @abc.abstractmethod
+    def enqueue(self, run_id: str, job_key: str, payload: dict) -> None:
+        """Add a job unless it already exists for this run (idempotent)."""
+
+    @abc.abstractmethod
+    def claim(self, run_id: str, worker: str, keys: List[str]) -> Optional[Tuple[str, dict]]:
+        """Lease the next due job among `keys`; None when nothing is claimable."""
+
+    @abc.abstractmethod
+    def heartbeat(self, run_id: str, job_key: str, worker: str) -> bool:
+        """Extend our lease; False if the job was reclaimed by someone else."""
+
+    @abc.abstractmethod
+    def complete(self, run_id: str, job_key: str, worker: str) -> None:
+        ...
+
+    @abc.abstractmethod
+    def fail(self, run_id: str, job_key: str, worker: str, error: str) -> None:
+        ...
+
+    @abc.abstractmethod
+    def outstanding(self, run_id: str) -> int:
+        """Jobs that are neither done nor permanently failed."""
+
+def _retry_delay(attempts: int) -> float:
+    return QUEUE_RETRY_BASE * 2 ** max(0, attempts - 1) * random.uniform(0.8, 1.2)
+
+class SqliteWorkQueue(WorkQueue):
+    """
+    SQLite-backed queue; point CITI_QUEUE_PATH at a shared volume to spread
+    accounts over several hosts. BEGIN IMMEDIATE serializes claims.
+    """
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path), timeout=30, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+            run_id TEXT, job_key TEXT, payload TEXT, state TEXT DEFAULT 'pending',
+            attempts INTEGER DEFAULT 0, lease_owner TEXT, lease_expires REAL DEFAULT 0,
+            next_run_at REAL, last_error TEXT, updated_at REAL,
+            PRIMARY KEY (run_id, job_key))""")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS hosts (
+            run_id TEXT, host TEXT, joined_at REAL, PRIMARY KEY (run_id, host))""")
+
+    def _tx(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                out = fn(self.conn)
+                self.conn.execute("COMMIT")
+                return out
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def enqueue(self, run_id: str, job_key: str, payload: dict) -> None:
+        now = time.time()
+        self._tx(lambda c: c.execute(
+            "INSERT OR IGNORE INTO jobs (run_id, job_key, payload, next_run_at, updated_at) VALUES (?,?,?,?,?)",
+            (run_id, job_key, json.dumps(payload), now, now)))
+
+    def claim(self, run_id: str, worker: str, keys: List[str]) -> Optional[Tuple[str, dict]]:
+        if not keys:
+            return None
+        marks = ",".join("?" for _ in keys)
+
+        def _claim(c: sqlite3.Connection):
+            now = time.time()
+            # A lease that lapsed on its final attempt is a dead job, not a retry
+            c.execute("""UPDATE jobs SET state = 'failed', lease_owner = NULL, updated_at = ?,
+                         last_error = TRIM(COALESCE(last_error, '') || ' [lease expired on final attempt]')
+                         WHERE run_id = ? AND state = 'leased' AND lease_expires < ? AND attempts >= ?""",
+                      (now, run_id, now, QUEUE_MAX_ATTEMPTS))
+            row = c.execute(f"""
+                SELECT job_key, payload FROM jobs
+                WHERE run_id = ? AND job_key IN ({marks})
+                  AND ((state = 'pending' AND next_run_at <= ?) OR (state = 'leased' AND lease_expires < ?))
+                  AND (job_key <> ? OR (
+                        (SELECT COUNT(*) FROM hosts h WHERE h.run_id = jobs.run_id) >= ?
+                        AND NOT EXISTS (
+                        SELECT 1 FROM jobs o WHERE o.run_id = jobs.run_id AND o.job_key <> ?
+                          AND o.state NOT IN ('done', 'failed'))))
+                ORDER BY next_run_at, rowid LIMIT 1""",
+                (run_id, *keys, now, now, CLEANUP_JOB, QUEUE_HOSTS, CLEANUP_JOB)).fetchone()
+            if not row:
+                return None
+            c.execute("""UPDATE jobs SET state = 'leased', lease_owner = ?, lease_expires = ?,
+                         attempts = attempts + 1, updated_at = ? WHERE run_id = ? AND job_key = ?""",
+                      (worker, now + QUEUE_LEASE_SECS, now, run_id, row[0]))
+            return row[0], json.loads(row[1] or "{}")
+
+        return self._tx(_claim)
+
+    def join(self, run_id: str, host: str) -> None:
+        self._tx(lambda c: c.execute("INSERT OR IGNORE INTO hosts (run_id, host, joined_at) VALUES (?,?,?)",
+                                     (run_id, host, time.time())))
+
+    def hosts(self, run_id: str) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM hosts WHERE run_id = ?", (run_id,)).fetchone()[0]
+
+    def heartbeat(self, run_id: str, job_key: str, worker: str) -> bool:
+        now = time.time()
+        cur = self._tx(lambda c: c.execute(
+            """UPDATE jobs SET lease_expires = ?, updated_at = ?
+               WHERE run_id = ? AND job_key = ? AND state = 'leased' AND lease_owner = ?""",
+            (now + QUEUE_LEASE_SECS, now, run_id, job_key, worker)))
+        return cur.rowcount == 1
+
+    def complete(self, run_id: str, job_key: str, worker: str) -> None:
+        self._tx(lambda c: c.execute(
+            """UPDATE jobs SET state = 'done', lease_owner = NULL, updated_at = ?
+               WHERE run_id = ? AND job_key = ? AND lease_owner = ?""",
+            (time.time(), run_id, job_key, worker)))
+
+    def fail(self, run_id: str, job_key: str, worker: str, error: str) -> None:
+        def _fail(c: sqlite3.Connection):
+            row = c.execute("SELECT attempts FROM jobs WHERE run_id = ? AND job_key = ? AND lease_owner = ?",
+                            (run_id, job_key, worker)).fetchone()
+            if not row:
+                return
+            now = time.time()
+            state = "failed" if row[0] >= QUEUE_MAX_ATTEMPTS else "pending"
+            c.execute("""UPDATE jobs SET state = ?, lease_owner = NULL, next_run_at = ?, last_error = ?,
+                         updated_at = ? WHERE run_id = ? AND job_key = ?""",
+                      (state, now + _retry_delay(row[0]), error[:500], now, run_id, job_key))
+        self._tx(_fail)
+
+    def outstanding(self, run_id: str) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM jobs WHERE run_id = ? AND state NOT IN ('done', 'failed')",
+                                     (run_id,)).fetchone()[0]
+
+class MemoryWorkQueue(WorkQueue):
+    """Process-local stand-in with the same lease semantics (single host / tests)."""
+
+    def __init__(self):
+        self.jobs: Dict[Tuple[str, str], dict] = {}
+        self.joined: Dict[str, Set[str]] = {}  # run id -> hosts
+        self._lock = threading.Lock()
+
+    def join(self, run_id: str, host: str) -> None:
+        with self._lock:
+            self.joined.setdefault(run_id, set()).add(host)
+
+    def hosts(self, run_id: str) -> int:
+        with self._lock:
+            return len(self.joined.get(run_id, ()))
+
+    def enqueue(self, run_id: str, job_key: str, payload: dict) -> None:
+        with self._lock:
+            self.jobs.setdefault((run_id, job_key), {
+                "payload": dict(payload), "state": "pending", "attempts": 0, "owner": None,
+                "lease_expires": 0.0, "next_run_at": time.time(), "last_error": "", "seq": len(self.jobs)})
+
+    def _due(self, run_id: str, key: str, job: dict, now: float) -> bool:
+        if job["state"] == "pending":
+            ready = job["next_run_at"] <= now
+        else:
+            ready = job["state"] == "leased" and job["lease_expires"] < now
+        if not ready or key != CLEANUP_JOB:
+            return ready
+        if len(self.joined.get(run_id, ())) < QUEUE_HOSTS:
+            return False
+        return not any(k[0] == run_id and k[1] != CLEANUP_JOB and j["state"] not in ("done", "failed")
+                       for k, j in self.jobs.items())
+
+    def claim(self, run_id: str, worker: str, keys: List[str]) -> Optional[Tuple[str, dict]]:
+        with self._lock:
+            now = time.time()
+            for k, j in self.jobs.items():
+                if (k[0] == run_id and j["state"] == "leased" and j["lease_expires"] < now
+                        and j["attempts"] >= QUEUE_MAX_ATTEMPTS):
+                    j.update(state="failed", owner=None,
+                             last_error=(j["last_error"] + " [lease expired on final attempt]").strip())
+            due = [(j["next_run_at"], j["seq"], k[1], j) for k, j in self.jobs.items()
+                   if k[0] == run_id and k[1] in keys and self._due(run_id, k[1], j, now)]
+            if not due:
+                return None
+            _, _, key, job = min(due, key=lambda d: (d[0], d[1]))
+            job.update(state="leased", owner=worker, lease_expires=now + QUEUE_LEASE_SECS,
+                       attempts=job["attempts"] + 1)
+            return key, dict(job["payload"])
+
+    def heartbeat(self, run_id: str, job_key: str, worker: str) -> bool:
+        with self._lock:
+            job = self.jobs.get((run_id, job_key))
+            if not job or job["state"] != "leased" or job["owner"] != worker:
+                return False
+            job["lease_expires"] = time.time() + QUEUE_LEASE_SECS
+            return True
+
+    def complete(self, run_id: str, job_key: str, worker: str) -> None:
+        with self._lock:
+            job = self.jobs.get((run_id, job_key))
+            if job and job["owner"] == worker:
+                job.update(state="done", owner=None)
+
+    def fail(self, run_id: str, job_key: str, worker: str, error: str) -> None:
+        with self._lock:
+            job = self.jobs.get((run_id, job_key))
+            if job and job["owner"] == worker:
+                job.update(state="failed" if job["attempts"] >= QUEUE_MAX_ATTEMPTS else "pending",
+                           owner=None, next_run_at=time.time() + _retry_delay(job["attempts"]),
+                           last_error=error[:500])
+
+    def outstanding(self, run_id: str) -> int:
+        with self._lock:
+            return sum(1 for k, j in self.jobs.items() if k[0] == run_id and j["state"] not in ("done", "failed"))
+
+print("Classes 'WorkQueue', 'SqliteWorkQueue', 'MemoryWorkQueue' loaded – lease-based account queue ready.")
+
+def open_work_queue() -> WorkQueue:
+    """Backend chosen by CITI_QUEUE_BACKEND."""
+    if QUEUE_BACKEND == "memory":
+        return MemoryWorkQueue()
+    if QUEUE_BACKEND == "sqlite":
+        return SqliteWorkQueue(QUEUE_PATH)
+    sys.exit(f"Unknown CITI_QUEUE_BACKEND '{QUEUE_BACKEND}' – use sqlite or memory")
+
+class LeaseHeartbeat:
+    """
+    Context manager that renews a job lease in the background while work runs.
+    If a renewal is refused the job belongs to someone else: `lost` is set and
+    `on_lost` (if given) is called from the heartbeat thread to stop the work.
+    """
+
+    def __init__(self, wq: WorkQueue, run_id: str, job_key: str, worker: str,
+                 on_lost: Optional[Callable[[], None]] = None):
+        self.wq, self.run_id, self.job_key, self.worker = wq, run_id, job_key, worker
+        self.on_lost = on_lost
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"lease-{job_key}", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(QUEUE_HEARTBEAT_SECS):
+            try:
+                if not self.wq.heartbeat(self.run_id, self.job_key, self.worker):
+                    self.lost = True
+                    print(f"[QUEUE] lease on {self.job_key} lost – another worker may pick it up")
+                    if self.on_lost:
+                        self.on_lost()
+                    return
+            except Exception as exc:
+                print(f"[QUEUE] heartbeat failed for {self.job_key} ({type(exc).__name__}: {exc})")
+
+    def __enter__(self) -> "LeaseHeartbeat":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+print("Function 'open_work_queue' and class 'LeaseHeartbeat' loaded – queue plumbing ready.")
+print("Section 'account work queue' complete – distributed runs ready.")
+
 # ---------------------------------------------------------------------------
 # Main & entrypoint
 # ---------------------------------------------------------------------------
 
 def safe_quit():
     """Attempt to close the browser without raising on invalid session."""
+    if driver is None:
+        return
     try:
         driver.quit()
     except InvalidSessionIdException:
@@ -1052,27 +3758,454 @@ def safe_quit():
 
 print("Function 'safe_quit' loaded – graceful driver shutdown ready.")
 
+def run_sheet_cleanup() -> None:
+    """Expire, dedupe and re-filter the offer sheet once output has landed."""
+    # Sheet cleanup runs once the replica (if any) has caught up
+    if not OUTPUT.sync():
+        sheet_log("WARN", "main", "Sheets replica still behind – cleanup may miss recent rows")
+    if OFFER_WS is None:
+        sheet_log("WARN", "cleanup", "Sheets unreachable – sheet cleanup skipped this run")
+        return
+    try:
+        delete_expired_rows()
+        dedupe_rows()
+        reset_filters_full_range()
+    except Exception as exc:
+        sheet_log("ERROR", "cleanup", f"{type(exc).__name__}: {exc}")
+
+print("Function 'run_sheet_cleanup' loaded – end-of-run maintenance ready.")
+
+BENCH_NEW_OFFERS = 100  # offers written by one simulated scrape_card flush
+
+def bench_rows(n: int, rng: random.Random) -> List[List[str]]:
+    """`n` synthetic offer rows: roughly 10% expired and 5% exact duplicates."""
+    today = date.today()
+    rows: List[List[str]] = []
+    for i in range(n):
+        if rows and rng.random() < 0.05:
+            rows.append(list(rng.choice(rows)))
+            continue
+        days = rng.randint(-60, -1) if rng.random() < 0.10 else rng.randint(1, 120)
+        rows.append([rng.choice(("Andrew", "Holder B", "Holder C")), f"{rng.randint(0, 9999):04d}",
+                     "Citi Test Card", f"Brand {i % 2500}", f"{rng.randint(5, 20)}% back",
+                     f"${rng.randint(5, 50)}", f"${rng.randint(10, 100)}", today.strftime("%m/%d/%Y"),
+                     (today + timedelta(days=days)).strftime("%b %d, %Y"), "No"])
+    return rows
+
+def run_sheets_bench(sizes: List[int]) -> None:
+    """
+    Time the Sheets write/cleanup path against FakeSpreadsheet at each size:
+    API calls (per gspread method) and wall time. The client's own rate limit
+    is lifted so the numbers reflect call counts plus injected latency.
+    Archive and index writes go to a temp dir.
+    """
+    global SHEET, SHEETS, OFFER_WS, LOG_WS, OUTPUT, ARCHIVE_DIR, INDEX_PATH, OFFER_INDEX, INDEX_KEYS, INDEX_SEEN
+    print(f"Sheets benchmark – fake backend, {FAKE_SHEETS_LATENCY_MS:.0f} ms/call, "
+          f"{FAKE_SHEETS_429_RATE:.0%} quota errors, {BENCH_NEW_OFFERS} offers per card flush")
+    print(f"{'rows':>7}  {'operation':<26}{'calls':>6}{'wall s':>9}  by method")
+    terms = {"brand": "Bench Brand", "disc": "10% back", "maxd": "$10", "mins": "$25",
+             "exp": (date.today() + timedelta(days=30)).strftime("%b %d, %Y"), "local": "No"}
+
+    def card_flush() -> None:
+        pipeline = OfferPipeline(set(), "bench")
+        for i in range(BENCH_NEW_OFFERS):
+            pipeline.submit({"holder": "Bench", "card": "Citi Test Card", "last4": f"{i:04d}", "terms": terms})
+        pipeline.close()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ARCHIVE_DIR, INDEX_PATH = Path(tmp) / "archive", Path(tmp) / "offer_index.json"
+        for n in sizes:
+            SHEET = FakeSpreadsheet(f"bench-{n}")
+            SHEETS = SheetsClient(SHEET, rpm=10**6)
+            OFFER_WS = _ws(SHEET, "Card Offers", OFFER_HEADERS)
+            LOG_WS = _ws(SHEET, "Log", LOG_HEADERS)
+            OFFER_WS.data.extend(bench_rows(n, random.Random(n)))  # seeded directly, not through the API
+            OFFER_INDEX, INDEX_KEYS, INDEX_SEEN = {}, [], {}
+            OUTPUT = SheetsSink("Card Offers", OFFER_HEADERS, OFFER_WS, on_write=reset_filters_full_range)
+            for name, step in (("scrape_card flush", card_flush), ("delete_expired_rows", delete_expired_rows),
+                               ("dedupe_rows", dedupe_rows), ("reset_filters_full_range", reset_filters_full_range)):
+                SHEETS.flush()
+                SHEET.calls.clear()
+                SHEETS.calls = 0
+                t0 = time.perf_counter()
+                step()
+                SHEETS.flush()  # queued deletes/filters/log rows count towards the step
+                secs = time.perf_counter() - t0
+                by_method = ", ".join(f"{k}={v}" for k, v in sorted(SHEET.calls.items()))
+                print(f"{n:>7}  {name:<26}{SHEETS.calls:>6}{secs:>9.3f}  {by_method}")
+
+print("Functions 'bench_rows', 'run_sheets_bench' loaded – Sheets benchmark ready.")
+
+def run_smoke_test() -> bool:
+    """
+    Offline checks for what normally needs a live account: the HTTP fast path
+    against the mock offer API (enroll, re-run, the fallback signal when the
+    API is gone) and MemoryWorkQueue's lease and cleanup rules. Output goes to
+    the fake Sheets backend and a temp dir. True when every check passes.
+    """
+    global API_BASE, ARCHIVE_DIR, INDEX_PATH, OFFER_INDEX, INDEX_KEYS, INDEX_SEEN, TERMS_CACHE_FILE
+    global QUEUE_LEASE_SECS, QUEUE_RETRY_BASE
+    failures: List[str] = []
+
+    def check(name: str, ok: bool, detail: str = "") -> None:
+        print(f"  {'ok  ' if ok else 'FAIL'}  {name}" + (f" ({detail})" if detail and not ok else ""))
+        if not ok:
+            failures.append(name)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ARCHIVE_DIR, INDEX_PATH, TERMS_CACHE_FILE = Path(tmp) / "archive", Path(tmp) / "offer_index.json", ""
+        OFFER_INDEX, INDEX_KEYS, INDEX_SEEN = {}, [], {}
+
+        print("HTTP fast path against the mock API")
+        MockOfferApiHandler.state = json.loads(json.dumps(MOCK_SAMPLE_OFFERS))
+        server = ThreadingHTTPServer(("127.0.0.1", 0), MockOfferApiHandler)
+        threading.Thread(target=server.serve_forever, name="mock-api", daemon=True).start()
+        API_BASE = f"http://127.0.0.1:{server.server_address[1]}"
+        try:
+            n = http_enroll_account("Smoke", set())
+            check("enrolls every open offer", n == 2, f"{n} enrolled")
+            rows = OUTPUT.existing_rows()
+            check("enrolled offers reach the output sink", len(rows) == 2, f"{len(rows)} row(s)")
+            n = http_enroll_account("Smoke", {tuple(r) for r in rows})
+            check("a re-run finds nothing left to enroll", n == 0, f"{n} enrolled")
+        except Exception as exc:
+            check("fast path completes", False, f"{type(exc).__name__}: {exc}")
+        finally:
+            server.shutdown()
+            server.server_close()
+        try:
+            http_enroll_account("Smoke", set())
+            check("unreachable API raises FastPathUnavailable", False, "no error")
+        except FastPathUnavailable:
+            check("unreachable API raises FastPathUnavailable", True)
+        except Exception as exc:
+            check("unreachable API raises FastPathUnavailable", False, type(exc).__name__)
+
+    print("MemoryWorkQueue")
+    QUEUE_LEASE_SECS, QUEUE_RETRY_BASE = 0.2, 0.0
+    wq, run = MemoryWorkQueue(), "smoke"
+    for key in ("a", "b", CLEANUP_JOB, "a"):
+        wq.enqueue(run, key, {})
+    check("enqueue is idempotent", wq.outstanding(run) == 3, f"{wq.outstanding(run)} outstanding")
+    check("cleanup waits for the hosts to join", wq.claim(run, "w1", [CLEANUP_JOB]) is None)
+    wq.join(run, "smoke-host")
+    job = wq.claim(run, "w1", ["a", CLEANUP_JOB])
+    check("accounts are claimed before cleanup", bool(job) and job[0] == "a", str(job))
+    wq.complete(run, "a", "w1")
+    wq.claim(run, "w1", ["b"])
+    time.sleep(QUEUE_LEASE_SECS + 0.1)
+    job = wq.claim(run, "w2", ["b"])
+    check("an expired lease is reclaimed", bool(job) and job[0] == "b", str(job))
+    check("the old owner's heartbeat is refused", not wq.heartbeat(run, "b", "w1"))
+    wq.fail(run, "b", "w2", "smoke failure")
+    wq.claim(run, "w3", ["b"])  # last attempt
+    time.sleep(QUEUE_LEASE_SECS + 0.1)
+    job = wq.claim(run, "w4", ["b", CLEANUP_JOB])
+    check("a lease lapsed on the last attempt fails the job", wq.jobs[(run, "b")]["state"] == "failed",
+          wq.jobs[(run, "b")]["state"])
+    check("cleanup follows once no account is outstanding", bool(job) and job[0] == CLEANUP_JOB, str(job))
+    wq.complete(run, CLEANUP_JOB, "w4")
+    check("the run drains", wq.outstanding(run) == 0, f"{wq.outstanding(run)} outstanding")
+
+    print(f"Smoke test {'passed' if not failures else 'FAILED – ' + ', '.join(failures)}.")
+    return not failures
+
+print("Function 'run_smoke_test' loaded – offline smoke test ready.")
+
+def run_worker() -> None:
+    """
+    Pull accounts from the shared queue until the run is drained. Jobs are keyed
+    by username; each host only claims accounts it has credentials for.
+    """
+    wq = open_work_queue()
+    by_user = {a["user"]: a for a in ACCOUNTS}
+    for acct in ACCOUNTS:
+        wq.enqueue(QUEUE_RUN_ID, acct["user"], {"holder": acct["holder"]})
+    wq.enqueue(QUEUE_RUN_ID, CLEANUP_JOB, {})
+    wq.join(QUEUE_RUN_ID, WORKER_HOST)  # only after our accounts are in: gates cleanup
+    keys = list(by_user) + [CLEANUP_JOB]
+    sheet_log("INFO", "worker", f"{WORKER_ID} joined run {QUEUE_RUN_ID} "
+                                f"({wq.hosts(QUEUE_RUN_ID)}/{QUEUE_HOSTS} host(s))")
+
+    processed = 0
+    last_holder = ""
+    told_waiting = False
+    while True:
+        job = wq.claim(QUEUE_RUN_ID, WORKER_ID, keys)
+        if not job:
+            if wq.outstanding(QUEUE_RUN_ID) == 0:
+                break
+            joined = wq.hosts(QUEUE_RUN_ID)
+            if joined < QUEUE_HOSTS and not told_waiting:
+                sheet_log("INFO", "worker", f"cleanup waits for {QUEUE_HOSTS - joined} more host(s) to join")
+                told_waiting = True
+            time.sleep(QUEUE_POLL_SECS)  # others still working, or retries not yet due
+            continue
+        key, payload = job
+        if processed and key != CLEANUP_JOB:
+            reason = recycle_reason(last_holder)
+            if reason:
+                restart_driver(reason)
+        error = ""
+        holder = payload.get("holder", key)
+        # Losing the lease mid-account means another host may log in: stop the browser now
+        on_lost = None if key == CLEANUP_JOB else (
+            lambda: WATCHDOG.abort(DeadlineExceeded("lease", holder, QUEUE_LEASE_SECS, "lost")))
+        with LeaseHeartbeat(wq, QUEUE_RUN_ID, key, WORKER_ID, on_lost=on_lost) as hb:
+            try:
+                if key == CLEANUP_JOB:
+                    if not CLI.scan_only:
+                        run_sheet_cleanup()
+                    ok = True
+                else:
+                    sheet_log("INFO", "account", f"start {holder} (worker {WORKER_ID})")
+                    processed += 1
+                    last_holder = holder
+                    ok = run_account_guarded(by_user[key])
+                    error = "" if ok else "login or offers navigation failed"
+            except Exception as exc:
+                ok, error = False, f"{type(exc).__name__}: {exc}"
+                sheet_log("ERROR", "account", f"{holder} aborted: {error}")
+                try:
+                    citi_logout()
+                except Exception:
+                    pass
+        if hb.lost:
+            sheet_log("WARN", "worker", f"lease on {holder} lost – leaving the job to its new owner")
+        elif ok:
+            wq.complete(QUEUE_RUN_ID, key, WORKER_ID)
+        else:
+            wq.fail(QUEUE_RUN_ID, key, WORKER_ID, error)
+
+print("Function 'run_worker' loaded – queue-driven account loop ready.")
+
+def run_account_guarded(acct: dict) -> bool:
+    """scrape_account under ACCOUNT_DEADLINE; a watchdog breach rebuilds the browser and fails the account."""
+    started = time.monotonic()
+    ok = False
+    try:
+        with WATCHDOG.phase("account", acct["holder"], ACCOUNT_DEADLINE):
+            ok = scrape_account(acct)
+        return ok
+    except DeadlineExceeded as exc:
+        sheet_log("ERROR", "watchdog", f"{exc} – abandoning {acct['holder']}, rebuilding browser")
+        restart_driver(reason=str(exc))
+        raise RuntimeError(str(exc)) from None
+    finally:
+        report_event("account", holder=acct["holder"], ok=ok, secs=round(time.monotonic() - started, 1))
+        if RECORDER:
+            RECORDER.write()
+
+def run_one_account(acct: dict) -> bool:
+    """scrape_account with the usual logging and logout-on-error guard."""
+    sheet_log("INFO", "account", f"start {acct['holder']}")
+    try:
+        return run_account_guarded(acct)
+    except Exception as exc:
+        sheet_log("ERROR", "account", f"{acct['holder']} aborted: {type(exc).__name__}: {exc}")
+        try:
+            citi_logout()
+        except Exception:
+            pass
+        return False
+
+print("Functions 'run_account_guarded', 'run_one_account' loaded – guarded account runner ready.")
+
+def learn_account_intervals(rows: List[List[str]], today: Optional[date] = None,
+                            checks: Optional[Dict[str, List[float]]] = None) -> Dict[str, Tuple[float, Set[int]]]:
+    """
+    From offer rows, learn per holder how often new offers appear: returns
+    {holder: (hours between checks, weekdays that historically had new offers)}.
+
+    With at least two recorded checks (`checks`: holder -> check timestamps),
+    the rate is measured against how often the account was actually checked:
+    a check is a hit when offers were added that day, new offers are taken to
+    arrive at a steady rate, and the interval is the expected time between
+    arrivals. When nearly every check is a hit, the interval drops below the
+    current cadence; when few are, it grows. Without check history it falls
+    back to the window divided by the number of distinct 'Date Added' days.
+    Clamped to [DAEMON_MIN_HOURS, DAEMON_MAX_HOURS].
+    """
+    today = today or date.today()
+    checks = checks or {}
+    days: Dict[str, Set[date]] = {}
+    for r in rows:
+        if len(r) < 8:
+            continue
+        try:
+            added = datetime.strptime(r[7].strip(), "%m/%d/%Y").date()
+        except ValueError:
+            continue
+        if 0 <= (today - added).days <= DAEMON_LOOKBACK_DAYS:
+            days.setdefault(r[0], set()).add(added)
+    cutoff = datetime.combine(today - timedelta(days=DAEMON_LOOKBACK_DAYS), datetime.min.time()).timestamp()
+    out: Dict[str, Tuple[float, Set[int]]] = {}
+    for holder in set(days) | set(checks):
+        seen_days = days.get(holder, set())
+        stamps = sorted(t for t in checks.get(holder, []) if t >= cutoff)
+        if len(stamps) >= 2:
+            gap_h = (stamps[-1] - stamps[0]) / 3600 / (len(stamps) - 1)
+            hits = sum(1 for t in stamps if date.fromtimestamp(t) in seen_days)
+            p_hit = (hits + 0.5) / (len(stamps) + 1)  # smoothed; never exactly 0 or 1
+            hours = gap_h / -math.log(1 - p_hit)      # P(hit in gap) = 1 - exp(-gap / hours)
+        elif seen_days:
+            window = max(1, (today - min(seen_days)).days + 1)
+            hours = 24.0 * window / len(seen_days)
+        else:
+            continue
+        out[holder] = (min(DAEMON_MAX_HOURS, max(DAEMON_MIN_HOURS, hours)), {d.weekday() for d in seen_days})
+    return out
+
+def next_check_at(last_run: float, interval_h: float, weekdays: Set[int]) -> float:
+    """last_run + interval, nudged forward (by at most half an interval) onto a typical arrival weekday."""
+    due = last_run + interval_h * 3600
+    if interval_h < 24 or not weekdays:
+        return due
+    for shift in range(0, 7):
+        candidate = due + shift * 86400
+        if datetime.fromtimestamp(candidate).weekday() in weekdays:
+            return candidate if shift * 24 <= interval_h / 2 else due
+    return due
+
+print("Functions 'learn_account_intervals', 'next_check_at' loaded – adaptive schedule ready.")
+
+def load_daemon_state() -> Tuple[Dict[str, float], Dict[str, List[float]]]:
+    """(last-run time, check timestamps) per holder; older state files hold only last-run times."""
+    try:
+        with open(DAEMON_STATE_PATH, encoding="utf-8") as fh:
+            state = json.load(fh)
+    except Exception:
+        return {}, {}
+    if "last_run" not in state:
+        return state, {}
+    return state["last_run"], state.get("checks", {})
+
+def save_daemon_state(last_run: Dict[str, float], checks: Dict[str, List[float]]) -> None:
+    """Persist per-holder last-run and check times so restarts keep the schedule."""
+    try:
+        tmp = DAEMON_STATE_PATH.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump({"last_run": last_run, "checks": checks}, fh)
+        os.replace(tmp, DAEMON_STATE_PATH)
+    except Exception as exc:
+        print(f"[DAEMON] state save failed ({type(exc).__name__}: {exc})")
+
+def run_daemon() -> None:
+    """
+    Long-running service: the Sheets client and browser stay warm between
+    rounds; each account is re-checked when its learned interval comes due.
+    """
+    last_run, checks = load_daemon_state()
+    sheet_log("INFO", "daemon", f"started with {len(ACCOUNTS)} account(s)")
+
+    last_holder = ""  # last account on the warm browser, across rounds
+    while True:
+        try:
+            schedule = learn_account_intervals(OUTPUT.existing_rows(), checks=checks)
+        except Exception as exc:
+            sheet_log("WARN", "daemon", f"schedule read failed – {type(exc).__name__}: {exc}")
+            schedule = {}
+
+        def due_at(acct: dict) -> float:
+            # No history yet: check at the fastest cadence until we learn one
+            hours, weekdays = schedule.get(acct["holder"], (DAEMON_MIN_HOURS, set()))
+            return next_check_at(last_run.get(acct["holder"], 0.0), hours, weekdays)
+
+        due = [a for a in ACCOUNTS if due_at(a) <= time.time()]
+        for acct in due:
+            reason = recycle_reason(last_holder) if last_holder else None
+            if reason:
+                restart_driver(reason)
+            last_holder = acct["holder"]
+            run_one_account(acct)
+            now = time.time()
+            last_run[acct["holder"]] = now
+            horizon = now - DAEMON_LOOKBACK_DAYS * 86400
+            checks[acct["holder"]] = [t for t in checks.get(acct["holder"], []) if t >= horizon] + [now]
+            save_daemon_state(last_run, checks)
+
+        if due:
+            if not CLI.scan_only:
+                run_sheet_cleanup()
+            sheet_log("INFO", "daemon", f"round done – {len(due)} account(s) checked")
+            try:
+                rotate_log_sheet(refresh=True)
+            except Exception as exc:
+                print(f"[LOG_FAIL] log rotation skipped ({type(exc).__name__}: {exc})")
+        try:
+            if SHEETS:
+                SHEETS.flush()
+        except Exception as exc:
+            print(f"[LOG_FAIL] daemon flush ({type(exc).__name__}: {exc})")
+
+        # Park the warm browser; rebuild it if the session died while idle
+        try:
+            driver.get("about:blank")
+        except (Exception, DeadlineExceeded):
+            restart_driver(reason="idle session lost")
+            last_holder = ""
+
+        next_due = min(due_at(a) for a in ACCOUNTS)
+        pause = min(DAEMON_MAX_SLEEP, max(60.0, next_due - time.time()))
+        print(f"Daemon idle – next check in {pause / 60:.0f} min.")
+        time.sleep(pause)
+
+print("Functions 'run_daemon', 'load_daemon_state', 'save_daemon_state' loaded – service mode ready.")
+
 def main() -> None:
     """Run accounts (Andrew first), then do cleanup and finalize."""
+    if CLI.query:
+        run_query(CLI.query, CLI.spend)
+        return
+    if CLI.history:
+        run_history(CLI.history)
+        return
+    if CLI.serve_mock_api:
+        serve_mock_api(CLI.serve_mock_api)
+        return
+    if CLI.bench_sheets:
+        run_sheets_bench([int(n) for n in CLI.bench_sheets.split(",") if n.strip()])
+        return
+    if CLI.smoke_test:
+        if not run_smoke_test():
+            sys.exit(1)
+        return
+    if REPLAY_DIR:
+        run_replay(REPLAY_DIR)
+        return
     ACCOUNTS.sort(key=lambda a: a["holder"] != "Andrew")
+    if CLI.daemon:
+        run_daemon()
+        return
+    if CLI.worker:
+        run_worker()
+        sheet_log("INFO", "main", f"WORKER DONE ({WORKER_ID})")
+        if SHEETS:
+            SHEETS.flush()
+        print("Worker finished – run queue drained.")
+        return
+
     for i, acct in enumerate(ACCOUNTS, start=1):
-        sheet_log("INFO", "account", f"start {acct['holder']}")
         try:
-            scrape_account(acct)
-        except Exception as exc:
-            sheet_log("ERROR", "account", f"{acct['holder']} aborted: {type(exc).__name__}: {exc}")
-            try:
-                citi_logout()
-            except Exception:
-                pass
+            run_one_account(acct)
         finally:
-            if RESTART_BETWEEN_ACCOUNTS and i < len(ACCOUNTS):
-                restart_driver()
+            reason = recycle_reason(acct["holder"]) if i < len(ACCOUNTS) else None
+            if reason:
+                restart_driver(reason)
+
+    if CLI.scan_only:
+        if INVENTORY and not INVENTORY.sync():
+            sheet_log("WARN", "main", "Sheets replica still behind for the inventory snapshot")
+        sheet_log("INFO", "main", "SCAN COMPLETE")
+        if SHEETS:
+            SHEETS.flush()
+        print("Scan complete – offer inventory written.")
+        return
 
-    delete_expired_rows()
-    dedupe_rows()
-    reset_filters_full_range()
+    run_sheet_cleanup()
     sheet_log("INFO", "main", "COMPLETE")
+    if SHEETS:
+        SHEETS.flush()
     print("Run complete – offers synced and sheet updated.")
 
 print("Function 'main' loaded – orchestrator ready.")
@@ -1084,11 +4217,28 @@ if __name__ == "__main__":
         print("Browser window closed – script ended by user.")
         sheet_log("WARN", "main", f"Browser closed – {type(exc).__name__}")
         sys.exit(0)
-    except Exception as exc:
+    except (Exception, DeadlineExceeded) as exc:
         print(f"Fatal error – {type(exc).__name__}: {exc}")
         sheet_log("ERROR", "main", f"Fatal: {type(exc).__name__}: {exc}")
         sys.exit(1)
     finally:
+        for sink in (OUTPUT, INVENTORY):
+            try:
+                if sink:
+                    sink.close()
+            except Exception as exc:
+                print(f"Output close failed – {type(exc).__name__}: {exc}")
+        try:
+            flush_offer_index()
+        except Exception as exc:
+            print(f"[INDEX] save failed ({type(exc).__name__}: {exc})")
+        try:
+            if SHEETS:
+                SHEETS.flush()  # pending log rows / formatting
+        except Exception as exc:
+            print(f"[LOG_FAIL] final Sheets flush ({type(exc).__name__}: {exc})")
+        if NEEDS_BROWSER:
+            write_run_report()
         safe_quit()
 
 print("Section 'main & entrypoint' complete – script ready for execution.")